@@ -0,0 +1,2 @@
+# bench/__init__.py
+# Paquete de benchmarks y pruebas de carga (ver bench/benchmark.py).
@@ -0,0 +1,170 @@
+# bench/benchmark.py
+# ============================================
+# Benchmarks de las rutas reales de la app contra servidores locales.
+#
+# Uso (desde la raíz del repo):
+#   pip install -r bench/requirements.txt
+#   python -m bench.benchmark
+#   python -m bench.benchmark --sizes 1000,100000,1000000 --json bench_output.json
+#   python -m bench.benchmark --mongo-uri mongodb://localhost:27017
+# ============================================
+
+import argparse
+import json
+import shutil
+import statistics
+import tempfile
+import time
+
+from bench.stand_ins import (
+    ImageServer, connect_mongo, patch_db, generate_access_logs, set_bench_env
+)
+
+# ==============================
+# Medición
+# ==============================
+def percentile(values, q):
+    """Percentil `q` (0-100) por interpolación lineal."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    k = (len(ordered) - 1) * q / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def measure(name, fn, repeat, warmup=1, items_per_call=1):
+    """
+    Ejecuta `fn` `repeat` veces y retorna latencias (ms) y throughput.
+    `items_per_call` sirve para reportar documentos/s en operaciones por lote.
+    """
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    total_s = sum(times) / 1000
+    return {
+        "name": name,
+        "runs": repeat,
+        "p50_ms": percentile(times, 50),
+        "p90_ms": percentile(times, 90),
+        "p99_ms": percentile(times, 99),
+        "mean_ms": statistics.fmean(times),
+        "ops_per_s": (repeat * items_per_call) / total_s if total_s else float("inf"),
+    }
+
+
+def print_report(results):
+    header = f"{'benchmark':54} {'runs':>5} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'ops/s':>11}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['name']:54} {r['runs']:>5} {r['p50_ms']:>9.2f} {r['p90_ms']:>9.2f} "
+              f"{r['p99_ms']:>9.2f} {r['ops_per_s']:>11.1f}")
+
+# ==============================
+# Escenarios
+# ==============================
+def bench_download(server, repeat):
+    from photo_checker import download_image, calculate_hash, stream_hash
+    url = server.url("download.jpg")
+    return [
+        measure("download_image + calculate_hash", lambda: calculate_hash(download_image(url)), repeat),
+        measure("stream_hash (200, sin caché)", lambda: stream_hash(url, cache=False), repeat),
+    ]
+
+
+def bench_check(server, db, repeat):
+    from photo_checker import check_and_update_photo
+    url = server.url("check.jpg")
+    db.insert_photo_record(url, "hash-inicial")
+    check_and_update_photo()  # primer check: registra hash real y ETag
+
+    def changed():
+        server.bump("check.jpg")
+        check_and_update_photo()
+
+    return [
+        measure("check_and_update_photo (304, sin cambios)", check_and_update_photo, repeat),
+        measure("check_and_update_photo (foto nueva)", changed, repeat),
+    ]
+
+
+def bench_insert(db, repeat):
+    counter = iter(range(10 ** 9))
+
+    def insert_new():
+        db.insert_photo_record("http://bench/insert.jpg", f"{next(counter):064x}")
+
+    def insert_same():
+        db.insert_photo_record("http://bench/insert.jpg", "0" * 64)
+
+    return [
+        measure("insert_photo_record (nuevo)", insert_new, repeat),
+        measure("insert_photo_record (idempotente)", insert_same, repeat),
+    ]
+
+
+def bench_access_logs(database, db, sizes, repeat):
+    from sections.history import logs_to_dataframe
+    results = []
+    generated = 0
+    for size in sizes:
+        generate_access_logs(database, size - generated, seed=size)
+        generated = size
+
+        window = min(size, db.DEFAULT_LOG_WINDOW)
+        results.append(measure(
+            f"get_access_logs + DataFrame (n={size}, últimos {window})",
+            lambda: logs_to_dataframe(db.get_access_logs()), repeat, items_per_call=window))
+        results.append(measure(
+            f"get_access_logs_page (n={size})",
+            lambda: db.get_access_logs_page(), repeat, items_per_call=db.LOG_PAGE_SIZE))
+        if size <= 100000:
+            results.append(measure(
+                f"get_access_logs completo + DataFrame (n={size})",
+                lambda: logs_to_dataframe(db.get_access_logs(limit=None)),
+                max(1, repeat // 10), warmup=0, items_per_call=size))
+    return results
+
+# ==============================
+# Main
+# ==============================
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks de photo-update")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Tamaños de access_log a generar (separados por coma)")
+    parser.add_argument("--repeat", type=int, default=50, help="Repeticiones por escenario")
+    parser.add_argument("--image-kb", type=int, default=200, help="Tamaño de la imagen sintética")
+    parser.add_argument("--mongo-uri", default=None,
+                        help="mongod local (por defecto mongomock en memoria)")
+    parser.add_argument("--json", default=None, help="Guardar resultados en un archivo JSON")
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp(prefix="photo-update-bench-")
+    set_bench_env(cache_dir)
+
+    database = connect_mongo(args.mongo_uri)
+    db = patch_db(database)
+    sizes = sorted(int(s) for s in args.sizes.split(",") if s)
+
+    results = []
+    with ImageServer(args.image_kb * 1024) as server:
+        results += bench_download(server, args.repeat)
+        results += bench_check(server, db, args.repeat)
+    results += bench_insert(db, args.repeat)
+    results += bench_access_logs(database, db, sizes, args.repeat)
+    db.flush_writes()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# bench/import_time.py
+# ============================================
+# Presupuesto de tiempo de importación (arranque en frío).
+#
+# Importa cada módulo en un intérprete nuevo, mide el tiempo y verifica que
+# la ruta de verificación no cargue dependencias pesadas (Streamlit, pandas,
+# Twilio, NumPy, Pillow). Sale con código 1 si algo excede el presupuesto.
+#
+# Uso (desde la raíz del repo):
+#   python -m bench.import_time
+#   python -m bench.import_time --budget-ms 400 --repeat 5
+#   python -X importtime -c "import photo_checker" 2> importtime.log   # detalle
+# ============================================
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Módulo → dependencias que NO debe cargar al importarse
+TARGETS = {
+    "photo_checker": ("streamlit", "pandas", "twilio", "numpy", "PIL"),
+    "worker": ("streamlit", "pandas", "twilio", "numpy", "PIL"),
+    "watch_engine": ("streamlit", "pandas", "twilio", "numpy", "PIL"),
+    "db": ("streamlit", "pandas", "twilio", "numpy", "PIL"),
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"ms": elapsed * 1000, "modules": sorted(sys.modules)}}))
+"""
+
+# ==============================
+# Medición
+# ==============================
+def probe(module: str) -> dict:
+    """Importa `module` en un proceso nuevo; retorna {"ms", "modules"}."""
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module)],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def check_module(module: str, forbidden, budget_ms: float, repeat: int) -> dict:
+    runs = [probe(module) for _ in range(repeat)]
+    loaded = {name.split(".")[0] for name in runs[-1]["modules"]}
+    heavy = sorted(set(forbidden) & loaded)
+    ms = statistics.median(r["ms"] for r in runs)
+    return {
+        "module": module,
+        "median_ms": ms,
+        "heavy": heavy,
+        "ok": ms <= budget_ms and not heavy,
+    }
+
+# ==============================
+# Main
+# ==============================
+def main():
+    parser = argparse.ArgumentParser(description="Presupuesto de importación")
+    parser.add_argument("--budget-ms", type=float, default=500.0,
+                        help="Máximo (mediana) por módulo en milisegundos")
+    parser.add_argument("--repeat", type=int, default=3, help="Procesos por módulo")
+    parser.add_argument("--modules", default=",".join(TARGETS),
+                        help="Módulos a medir (separados por coma)")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'módulo':16} {'mediana ms':>11}  dependencias pesadas")
+    for module in (m for m in args.modules.split(",") if m):
+        result = check_module(module, TARGETS.get(module, ()), args.budget_ms, args.repeat)
+        failed |= not result["ok"]
+        mark = "✅" if result["ok"] else "❌"
+        print(f"{module:16} {result['median_ms']:>11.1f}  "
+              f"{', '.join(result['heavy']) or '-'} {mark}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+# bench/stand_ins.py
+# ============================================
+# Reemplazos locales para benchmarks:
+#   - servidor HTTP de imágenes (con ETag / 304)
+#   - MongoDB (mongomock en memoria o un mongod local)
+# ============================================
+
+import hashlib
+import os
+import random
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytz
+
+# ==============================
+# Servidor HTTP de imágenes
+# ==============================
+class ImageServer:
+    """
+    Servidor HTTP local que sirve imágenes sintéticas en /img/<nombre>.
+    Cada imagen tiene un ETag estable y responde 304 a If-None-Match.
+    Usar `bump(nombre)` para simular que la foto cambió.
+    """
+
+    def __init__(self, size_bytes: int = 200 * 1024):
+        self.size_bytes = size_bytes
+        self._images = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_GET(self):
+                server.requests += 1
+                name = self.path.rsplit("/", 1)[-1]
+                body, etag = server.image(name)
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address
+        return f"http://{host}:{port}"
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/img/{name}"
+
+    def image(self, name: str):
+        with self._lock:
+            if name not in self._images:
+                self._images[name] = self._make(name, 0)
+            return self._images[name]
+
+    def bump(self, name: str):
+        """Cambia el contenido (y el ETag) de una imagen."""
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            self._images[name] = self._make(name, self._versions[name])
+
+    def _make(self, name: str, version: int):
+        seed = f"{name}:{version}".encode()
+        block = hashlib.sha256(seed).digest()
+        body = (block * (self.size_bytes // len(block) + 1))[:self.size_bytes]
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        return body, etag
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+# ==============================
+# MongoDB local
+# ==============================
+def connect_mongo(uri=None, db_name="photo_update_bench"):
+    """
+    Devuelve una base de datos para los benchmarks:
+    mongod local si se pasa `uri`, si no mongomock en memoria.
+    """
+    if uri:
+        from pymongo import MongoClient
+        client = MongoClient(uri)
+        client.drop_database(db_name)
+        return client[db_name]
+    import mongomock
+    return mongomock.MongoClient()[db_name]
+
+
+def patch_db(database, history_name="history"):
+    """
+    Redirige las funciones de conexión de db.py a `database`
+    (sin st.secrets ni sesión de Streamlit).
+    """
+    import db
+    db.get_db = lambda: database
+    db.get_collection = lambda: database[history_name]
+    db._ensure_latest_watcher = lambda col: None
+    database[history_name].create_index(
+        [("photo_url", 1), ("hash", 1)], name="photo_url_hash_unique", unique=True
+    )
+    database.access_log.create_index([("ts", -1), ("_id", -1)], name="ts_id")
+    return db
+
+
+def generate_access_logs(database, count: int, batch_size: int = 10000, seed: int = 42):
+    """
+    Inserta `count` documentos sintéticos en access_log (alrededor de Medellín,
+    un acceso cada ~5 minutos hacia atrás desde ahora).
+    """
+    rng = random.Random(seed)
+    start = datetime.now(pytz.UTC) - timedelta(minutes=5 * count)
+    batch = []
+    for i in range(count):
+        lat = 6.2442 + rng.uniform(-0.05, 0.05)
+        lon = -75.5812 + rng.uniform(-0.05, 0.05)
+        batch.append({
+            "ts": start + timedelta(minutes=5 * i),
+            "lat": lat,
+            "lon": lon,
+            "acc": rng.choice([5, 12, 35, 80, 150, 1200]),
+            "loc": {"type": "Point", "coordinates": [lon, lat]},
+        })
+        if len(batch) >= batch_size:
+            database.access_log.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        database.access_log.insert_many(batch, ordered=False)
+
+
+def set_bench_env(cache_dir: str):
+    """Variables de entorno para aislar caché y notificaciones."""
+    os.environ.setdefault("PHOTO_CACHE_DIR", cache_dir)
+    os.environ.setdefault("NOTIFY_TRANSPORT", "console")
+    os.environ.setdefault("LATEST_CACHE_TTL", "60")
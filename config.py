@@ -0,0 +1,131 @@
+# config.py
+# ============================================
+# Configuración explícita, independiente de Streamlit.
+#
+# Orden de precedencia (de menor a mayor):
+#   DEFAULTS ← archivo TOML ← variables de entorno ← configure(...)
+#
+# Archivo TOML: PHOTO_CONFIG o, si no existe, .streamlit/secrets.toml
+# (mismas secciones que ya usa la app: [mongodb], [twilio], [retention]).
+#
+# Variables de entorno (útiles en workers / contenedores):
+#   MONGODB_URI, MONGODB_DB, MONGODB_COLLECTION,
+#   MONGODB_MAX_POOL_SIZE, MONGODB_MIN_POOL_SIZE,
+#   MONGODB_SERVER_SELECTION_TIMEOUT_MS, MONGODB_CONNECT_TIMEOUT_MS,
+#   MONGODB_SOCKET_TIMEOUT_MS, MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+#   MONGODB_CHANGE_STREAMS,
+#   TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN, TWILIO_SANDBOX_NUMBER, TWILIO_TO_NUMBER
+# ============================================
+
+import copy
+import os
+import threading
+import tomllib
+
+DEFAULT_PATH = os.path.join(".streamlit", "secrets.toml")
+
+DEFAULTS = {
+    "mongodb": {
+        "uri": "",
+        "db": "photo_update_db",
+        "collection": "history",
+        "change_streams": False,
+        # Pool por proceso: pocos hilos por worker → pool chico y timeouts cortos
+        "max_pool_size": 20,
+        "min_pool_size": 0,
+        "server_selection_timeout_ms": 5000,
+        "connect_timeout_ms": 5000,
+        "socket_timeout_ms": 20000,
+        "wait_queue_timeout_ms": 5000,
+    },
+    "twilio": {},
+    "retention": {},
+}
+
+# (sección, clave) → (variable de entorno, tipo)
+ENV_VARS = {
+    ("mongodb", "uri"): ("MONGODB_URI", str),
+    ("mongodb", "db"): ("MONGODB_DB", str),
+    ("mongodb", "collection"): ("MONGODB_COLLECTION", str),
+    ("mongodb", "max_pool_size"): ("MONGODB_MAX_POOL_SIZE", int),
+    ("mongodb", "min_pool_size"): ("MONGODB_MIN_POOL_SIZE", int),
+    ("mongodb", "server_selection_timeout_ms"): ("MONGODB_SERVER_SELECTION_TIMEOUT_MS", int),
+    ("mongodb", "connect_timeout_ms"): ("MONGODB_CONNECT_TIMEOUT_MS", int),
+    ("mongodb", "socket_timeout_ms"): ("MONGODB_SOCKET_TIMEOUT_MS", int),
+    ("mongodb", "wait_queue_timeout_ms"): ("MONGODB_WAIT_QUEUE_TIMEOUT_MS", int),
+    ("mongodb", "change_streams"): ("MONGODB_CHANGE_STREAMS", bool),
+    ("twilio", "account_sid"): ("TWILIO_ACCOUNT_SID", str),
+    ("twilio", "auth_token"): ("TWILIO_AUTH_TOKEN", str),
+    ("twilio", "sandbox_number"): ("TWILIO_SANDBOX_NUMBER", str),
+    ("twilio", "to_number"): ("TWILIO_TO_NUMBER", str),
+}
+
+_config = None
+_lock = threading.Lock()
+
+# ==============================
+# Carga
+# ==============================
+def _merge(base: dict, extra) -> dict:
+    """Mezcla `extra` sobre `base` sección por sección (un nivel)."""
+    for name, values in (extra or {}).items():
+        if isinstance(values, dict):
+            base.setdefault(name, {}).update(values)
+        else:
+            base[name] = values
+    return base
+
+
+def _parse(kind, raw: str):
+    if kind is bool:
+        return raw.lower() in ("1", "true", "yes")
+    return kind(raw)
+
+
+def read_toml(path: str) -> dict:
+    """Lee un archivo TOML; retorna {} si no existe."""
+    try:
+        with open(path, "rb") as f:
+            return tomllib.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def load_config(path: str = None) -> dict:
+    """
+    Configuración efectiva: DEFAULTS ← TOML (`path`, PHOTO_CONFIG o
+    .streamlit/secrets.toml) ← variables de entorno.
+    """
+    cfg = _merge(copy.deepcopy(DEFAULTS),
+                 read_toml(path or os.environ.get("PHOTO_CONFIG", DEFAULT_PATH)))
+    for (name, key), (var, kind) in ENV_VARS.items():
+        raw = os.environ.get(var)
+        if raw:
+            cfg.setdefault(name, {})[key] = _parse(kind, raw)
+    return cfg
+
+
+def get_config() -> dict:
+    """Configuración del proceso (se carga una sola vez)."""
+    global _config
+    if _config is None:
+        with _lock:
+            if _config is None:
+                _config = load_config()
+    return _config
+
+
+def section(name: str) -> dict:
+    """Una sección de la configuración, p. ej. section("mongodb")."""
+    return get_config().get(name, {})
+
+
+def configure(overrides=None, *, path: str = None) -> dict:
+    """
+    Recarga la configuración aplicando `overrides` encima (adaptadores como
+    Streamlit, pruebas). Debe llamarse antes de abrir conexiones.
+    """
+    global _config
+    with _lock:
+        _config = _merge(load_config(path), overrides)
+    return _config
@@ -3,45 +3,94 @@
 # Manejo de conexión y operaciones MongoDB
 # ==============================
 
-import streamlit as st
-from pymongo import MongoClient
-from datetime import datetime
+import os
+from pymongo import MongoClient, ASCENDING, DESCENDING, GEOSPHERE, UpdateOne
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from datetime import datetime, timedelta
 import pytz
+import threading
+import time
+import config
+from write_buffer import WriteBuffer
+from geo_utils import celda_grilla
+from metrics import timed
 
 # Zona horaria local (Bogotá)
 colombia = pytz.timezone("America/Bogota")
 
-print("✅ db.py cargado (versión limpia con insert_photo_record)")
+# Consultas de accesos: ventana por defecto, tamaño de página y proyección
+DEFAULT_LOG_WINDOW = 500
+LOG_PAGE_SIZE = 50
+ACCESS_LOG_FIELDS = {"ts": 1, "lat": 1, "lon": 1, "acc": 1}
 
 # ==============================
 # Conexión MongoDB
 # ==============================
 
-@st.cache_resource
+def _mongo_config() -> dict:
+    """Sección [mongodb] de la configuración del proceso (ver config.py)."""
+    return config.section("mongodb")
+
+
+def client_options(cfg: dict) -> dict:
+    """
+    Opciones del pool de MongoClient a partir de la configuración.
+    connect=False: el cliente no abre sockets ni hilos hasta la primera
+    operación (seguro de crear antes de un fork).
+    """
+    return {
+        "maxPoolSize": int(cfg["max_pool_size"]),
+        "minPoolSize": int(cfg["min_pool_size"]),
+        "serverSelectionTimeoutMS": int(cfg["server_selection_timeout_ms"]),
+        "connectTimeoutMS": int(cfg["connect_timeout_ms"]),
+        "socketTimeoutMS": int(cfg["socket_timeout_ms"]),
+        "waitQueueTimeoutMS": int(cfg["wait_queue_timeout_ms"]),
+        "appname": "photo-update",
+        "connect": False,
+    }
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
 def get_client():
     """
-    Crea y cachea un cliente MongoDB usando la URI guardada en st.secrets.
-    Retorna None si no está configurado.
+    Cliente MongoDB del proceso actual (se crea al primer uso).
+    Retorna None si no hay URI configurada.
 
-    Requiere en .streamlit/secrets.toml:
+    Un MongoClient no sobrevive a un fork: si el PID cambió (worker en un
+    pool de procesos) se crea uno nuevo y el heredado se descarta sin cerrarlo,
+    porque sus sockets pertenecen al proceso padre.
+
+    Configuración (config.py): [mongodb] en PHOTO_CONFIG / .streamlit/secrets.toml
+    o variables de entorno MONGODB_*:
     [mongodb]
     uri = "mongodb+srv://..."
     db = "photo_update_db"
     collection = "history"
+    max_pool_size = 20
     """
-    uri = st.secrets.get("mongodb", {}).get("uri", "")
-    return MongoClient(uri) if uri else None
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client_pid != pid:
+        with _client_lock:
+            if _client_pid != pid:
+                cfg = _mongo_config()
+                _client = MongoClient(cfg["uri"], **client_options(cfg)) if cfg.get("uri") else None
+                _client_pid = pid
+    return _client
 
 
 def get_db():
     """
-    Obtiene el objeto de base de datos definido en st.secrets["mongodb"]["db"].
+    Obtiene la base de datos configurada en [mongodb] db.
     Default: "photo_update_db".
     """
     client = get_client()
     if client is not None:
-        db_name = st.secrets.get("mongodb", {}).get("db", "photo_update_db")
-        return client[db_name]
+        return client[_mongo_config()["db"]]
     return None
 
 
@@ -52,96 +101,919 @@ def get_collection():
     """
     db = get_db()
     if db is not None:
-        col_name = st.secrets.get("mongodb", {}).get("collection", "history")
-        return db[col_name]
+        return db[_mongo_config()["collection"]]
     return None
 
+
+def _reset_after_fork():
+    """
+    En el proceso hijo: descarta el estado heredado (cliente, buffer de
+    escritura, caché y watchers del último registro, locks posiblemente tomados).
+    """
+    global _client, _client_pid, _client_lock, _write_buffer, _write_buffer_lock
+    global _latest_lock, _indexes_lock
+    _client, _client_pid = None, None
+    _client_lock = threading.Lock()
+    _write_buffer = None
+    _write_buffer_lock = threading.Lock()
+    _latest_cache.clear()
+    _latest_watchers.clear()
+    _latest_lock = threading.Lock()
+    _indexes_lock = threading.Lock()
+
+
+# ==============================
+# Buffer de escritura (write-behind)
+# ==============================
+
+_write_buffer = None
+_write_buffer_lock = threading.Lock()
+
+
+def _buffer_collection(name: str):
+    """Resuelve el nombre lógico de colección para el buffer."""
+    if name == "history":
+        return get_collection()
+    db = get_db()
+    return db[name] if db is not None else None
+
+
+def get_write_buffer() -> WriteBuffer:
+    """
+    Devuelve el buffer de escritura del proceso (se crea al primer uso).
+    Se vacía automáticamente al salir del proceso.
+    """
+    global _write_buffer
+    if _write_buffer is None:
+        with _write_buffer_lock:
+            if _write_buffer is None:
+                _write_buffer = WriteBuffer(_buffer_collection, on_written=_after_buffered_write)
+    return _write_buffer
+
+
+def _after_buffered_write(name: str, docs: list):
+    """
+    Tras cada lote escrito: mantiene los rollups de access_log al día
+    e invalida la caché del último registro si se insertó historial.
+    """
+    if name == "access_log":
+        update_access_stats(docs)
+    elif name == "history":
+        invalidate_latest_record()
+
+
+def flush_writes():
+    """Fuerza la escritura de todo lo pendiente en el buffer."""
+    if _write_buffer is not None:
+        _write_buffer.flush()
+
+# ==============================
+# Índices (migración idempotente)
+# ==============================
+
+def index_specs():
+    """
+    Índices requeridos por colección: {colección: [(nombre, claves, opciones)]}.
+
+    - access_log: ts (+ _id como desempate para la paginación por keyset), loc (2dsphere)
+    - history   : photo_url + checked_at, hash, photo_url + hash (único),
+                  last_seen_at, loc (2dsphere)
+    - watches   : photo_url único
+    - locks     : expires_at
+    - access_stats: period + start
+    TTL opcional (días) en [mongodb]: access_log_ttl_days.
+    History no lleva TTL: lo expira retention.py sin tocar el registro vigente.
+    """
+    cfg = _mongo_config()
+    history_name = cfg["collection"]
+
+    specs = {
+        "access_log": [
+            ("ts_id", [("ts", DESCENDING), ("_id", DESCENDING)], {}),
+            ("loc_2dsphere", [("loc", GEOSPHERE)], {}),
+        ],
+        history_name: [
+            ("photo_url_checked_at", [("photo_url", ASCENDING), ("checked_at", DESCENDING)], {}),
+            ("hash", [("hash", ASCENDING)], {}),
+            ("photo_url_hash_unique", [("photo_url", ASCENDING), ("hash", ASCENDING)],
+             {"unique": True}),
+            ("last_seen_at_id", [("last_seen_at", DESCENDING), ("_id", DESCENDING)], {}),
+            ("loc_2dsphere", [("loc", GEOSPHERE)], {}),
+        ],
+        "watches": [
+            ("photo_url_unique", [("photo_url", ASCENDING)], {"unique": True}),
+        ],
+        "locks": [
+            ("expires_at", [("expires_at", ASCENDING)], {}),
+        ],
+        "access_stats": [
+            ("period_start", [("period", ASCENDING), ("start", DESCENDING)], {}),
+        ],
+    }
+
+    # TTL: índice de un solo campo con expireAfterSeconds
+    access_ttl = cfg.get("access_log_ttl_days")
+    if access_ttl:
+        specs["access_log"].append(
+            ("ts_ttl", [("ts", ASCENDING)], {"expireAfterSeconds": int(access_ttl) * 86400})
+        )
+    return specs
+
+
+def obsolete_indexes():
+    """Índices de versiones anteriores que ensure_indexes() elimina si existen."""
+    # TTL sobre checked_at: borraba el registro vigente de una foto estable
+    return {_mongo_config()["collection"]: ["checked_at_ttl"]}
+
+
+def ensure_indexes():
+    """
+    Crea los índices que falten (idempotente: create_index no hace nada
+    si ya existe uno igual) y elimina los obsoletos.
+    Retorna la lista de índices creados.
+    """
+    db = get_db()
+    if db is None:
+        return []
+
+    for col_name, names in obsolete_indexes().items():
+        existing = db[col_name].index_information()
+        for name in names:
+            if name in existing:
+                try:
+                    db[col_name].drop_index(name)
+                    print(f"🗑️ Índice obsoleto eliminado: {col_name}.{name}")
+                except PyMongoError as e:
+                    print(f"⚠️ No se pudo eliminar {col_name}.{name}: {e}")
+
+    created = []
+    for col_name, specs in index_specs().items():
+        existing = db[col_name].index_information()
+        for name, keys, options in specs:
+            if name not in existing:
+                try:
+                    db[col_name].create_index(keys, name=name, **options)
+                    created.append(f"{col_name}.{name}")
+                except PyMongoError as e:
+                    # p. ej. duplicados previos al índice único → dedupe_history()
+                    print(f"⚠️ No se pudo crear {col_name}.{name}: {e}")
+    if created:
+        print(f"✅ Índices creados: {', '.join(created)}")
+    return created
+
+
+_indexes_ensured = None
+_indexes_lock = threading.Lock()
+
+
+def ensure_indexes_once():
+    """
+    Ejecuta ensure_indexes() una sola vez por proceso (al arrancar la app).
+    """
+    global _indexes_ensured
+    with _indexes_lock:
+        if _indexes_ensured is None:
+            try:
+                _indexes_ensured = ensure_indexes()
+            except Exception as e:
+                print(f"⚠️ No se pudieron asegurar índices: {e}")
+                _indexes_ensured = []
+    return _indexes_ensured
+
+
+def index_report():
+    """
+    Reporte de índices por colección:
+      - missing: índices requeridos que no existen
+      - unused : índices existentes sin uso desde el último reinicio ($indexStats)
+    """
+    db = get_db()
+    if db is None:
+        return {}
+
+    report = {}
+    for col_name, specs in index_specs().items():
+        existing = db[col_name].index_information()
+        missing = [name for name, _keys, _opts in specs if name not in existing]
+        try:
+            stats = db[col_name].aggregate([{"$indexStats": {}}])
+            unused = [s["name"] for s in stats
+                      if s["name"] != "_id_" and s["accesses"]["ops"] == 0]
+        except Exception:
+            unused = []  # $indexStats no disponible (permisos / servidor)
+        report[col_name] = {"missing": missing, "unused": unused}
+    return report
+
+# ==============================
+# Locks distribuidos (evitar ejecuciones solapadas)
+# ==============================
+
+def acquire_lock(name: str, owner: str, ttl_seconds: int = 300) -> bool:
+    """
+    Intenta tomar el lock `name` en la colección `locks`.
+    El lock expira tras `ttl_seconds` (por si el dueño muere sin liberarlo).
+    Retorna True si se obtuvo (o renovó) el lock.
+    """
+    db = get_db()
+    if db is None:
+        return False
+    now = datetime.utcnow().replace(tzinfo=pytz.UTC)
+    try:
+        db.locks.find_one_and_update(
+            {"_id": name, "$or": [{"expires_at": {"$lt": now}}, {"owner": owner}]},
+            {"$set": {"owner": owner,
+                      "acquired_at": now,
+                      "expires_at": now + timedelta(seconds=ttl_seconds)}},
+            upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        # Otro proceso tiene el lock vigente
+        return False
+
+
+def release_lock(name: str, owner: str):
+    """
+    Libera el lock `name` solo si pertenece a `owner`.
+    """
+    db = get_db()
+    if db is not None:
+        db.locks.delete_one({"_id": name, "owner": owner})
+
 # ==============================
 # Logs de accesos
 # ==============================
 
-def insert_access_log(lat, lon, acc):
+def access_log_document(lat, lon, acc) -> dict:
+    """Documento de access_log con la hora actual y el punto GeoJSON (si hay coordenadas)."""
+    doc = {
+        "ts": datetime.now(colombia),  # Bogotá
+        "lat": lat,
+        "lon": lon,
+        "acc": acc
+    }
+    loc = geo_point(lat, lon)
+    if loc:
+        doc["loc"] = loc
+    return doc
+
+
+@timed("db.insert_access_log")
+def insert_access_log(lat, lon, acc, *, buffered=True):
     """
     Inserta un registro en la colección `access_log`.
+    Por defecto se encola en el buffer de escritura (bulk_write por lotes)
+    para no bloquear el render; buffered=False escribe de inmediato.
 
     Campos:
       - ts  : fecha y hora (Bogotá, local)
       - lat : latitud (float)
       - lon : longitud (float)
       - acc : precisión en metros (float/int)
+      - loc : punto GeoJSON [lon, lat] (solo si hay coordenadas válidas)
     """
+    doc = access_log_document(lat, lon, acc)
+    if buffered:
+        get_write_buffer().add("access_log", doc)
+        return
     db = get_db()
     if db is not None:
-        db.access_log.insert_one({
-            "ts": datetime.now(colombia),  # Bogotá
-            "lat": lat,
-            "lon": lon,
-            "acc": acc
-        })
+        db.access_log.insert_one(doc)
+        update_access_stats([doc])
+
 
+def time_window(since=None, until=None) -> dict:
+    """Filtro opcional por rango de fechas sobre `ts`."""
+    window = {}
+    if since is not None:
+        window["$gte"] = since
+    if until is not None:
+        window["$lt"] = until
+    return {"ts": window} if window else {}
 
-def get_access_logs():
+
+@timed("db.get_access_logs")
+def get_access_logs(limit=DEFAULT_LOG_WINDOW, *, since=None, until=None,
+                    fields=ACCESS_LOG_FIELDS):
     """
     Devuelve lista de registros de la colección `access_log`,
     ordenados cronológicamente (ascendente).
+
+    Por defecto solo trae los últimos `limit` registros (ventana "últimos N");
+    limit=None trae todo el rango. since/until filtran por `ts`,
+    fields define la proyección (None = documento completo).
     """
     db = get_db()
     if db is not None:
-        cursor = db.access_log.find().sort("ts", 1)
-        return list(cursor)
+        cursor = db.access_log.find(time_window(since, until), fields).sort("ts", -1)
+        if limit:
+            cursor = cursor.limit(limit)
+        logs = list(cursor)
+        logs.reverse()
+        return logs
     return []
 
+
+@timed("db.get_access_logs_page")
+def get_access_logs_page(page_size=LOG_PAGE_SIZE, after=None, *, since=None,
+                         until=None, fields=ACCESS_LOG_FIELDS):
+    """
+    Devuelve una página de `access_log` del más reciente al más antiguo,
+    paginando por keyset sobre (ts, _id) en vez de skip.
+
+    Parámetros:
+        page_size (int): registros por página
+        after (tuple|None): cursor (ts, _id) devuelto por la página anterior
+        since/until (datetime|None): rango de fechas opcional
+        fields (dict|None): proyección
+
+    Retorna:
+        (logs: list, next_cursor: tuple|None) — next_cursor None si no hay más.
+    """
+    db = get_db()
+    if db is None:
+        return [], None
+
+    query = time_window(since, until)
+    if after is not None:
+        ts, _id = after
+        query = {"$and": [query, {"$or": [
+            {"ts": {"$lt": ts}},
+            {"ts": ts, "_id": {"$lt": _id}},
+        ]}]}
+
+    logs = list(
+        db.access_log.find(query, fields)
+        .sort([("ts", -1), ("_id", -1)])
+        .limit(page_size)
+    )
+    next_cursor = (logs[-1]["ts"], logs[-1]["_id"]) if len(logs) == page_size else None
+    return logs, next_cursor
+
+# ==============================
+# Consultas geoespaciales (2dsphere)
+# ==============================
+
+EARTH_RADIUS_M = 6378100
+
+
+def geo_point(lat, lon):
+    """
+    Punto GeoJSON {"type": "Point", "coordinates": [lon, lat]}
+    o None si las coordenadas faltan o están fuera de rango.
+    """
+    if not isinstance(lat, (int, float)) or not isinstance(lon, (int, float)):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return {"type": "Point", "coordinates": [float(lon), float(lat)]}
+
+
+@timed("db.access_logs_near")
+def access_logs_near(lat, lon, max_meters=500, *, limit=100, fields=ACCESS_LOG_FIELDS):
+    """
+    Accesos a menos de `max_meters` del punto (lat, lon), del más cercano
+    al más lejano ($near sobre el índice 2dsphere).
+    Sin coordenadas válidas retorna [].
+    """
+    point = geo_point(lat, lon)
+    db = get_db()
+    if db is not None and point is not None:
+        query = {"loc": {"$near": {
+            "$geometry": point,
+            "$maxDistance": max_meters,
+        }}}
+        return list(db.access_log.find(query, fields).limit(limit))
+    return []
+
+
+@timed("db.access_logs_in_box")
+def access_logs_in_box(south, west, north, east, *, limit=1000, fields=ACCESS_LOG_FIELDS):
+    """
+    Accesos dentro del rectángulo (sur, oeste) – (norte, este) ($geoWithin).
+    """
+    db = get_db()
+    if db is not None:
+        box = {"type": "Polygon", "coordinates": [[
+            [west, south], [east, south], [east, north], [west, north], [west, south],
+        ]]}
+        query = {"loc": {"$geoWithin": {"$geometry": box}}}
+        return list(db.access_log.find(query, fields).sort("ts", -1).limit(limit))
+    return []
+
+
+@timed("db.count_access_logs_within")
+def count_access_logs_within(lat, lon, radius_meters=500):
+    """
+    Cantidad de accesos dentro de un radio (m) del punto ($geoWithin + $centerSphere).
+    Sin coordenadas válidas retorna 0.
+    """
+    point = geo_point(lat, lon)
+    db = get_db()
+    if db is not None and point is not None:
+        query = {"loc": {"$geoWithin": {
+            "$centerSphere": [point["coordinates"], radius_meters / EARTH_RADIUS_M],
+        }}}
+        return db.access_log.count_documents(query)
+    return 0
+
+
+def backfill_geo_points(collection="access_log", batch_size=1000):
+    """
+    Migración: agrega `loc` (GeoJSON) a los documentos existentes que tienen
+    lat/lon numéricos pero aún no tienen `loc`. Escribe por lotes con bulk_write.
+    Retorna la cantidad de documentos actualizados.
+    """
+    db = get_db()
+    if db is None:
+        return 0
+    col = get_collection() if collection == "history" else db[collection]
+
+    query = {"loc": {"$exists": False},
+             "lat": {"$type": "number"}, "lon": {"$type": "number"}}
+    updated = 0
+    ops = []
+    for doc in col.find(query, {"lat": 1, "lon": 1}).batch_size(batch_size):
+        loc = geo_point(doc["lat"], doc["lon"])
+        if loc:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"loc": loc}}))
+        if len(ops) >= batch_size:
+            updated += col.bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        updated += col.bulk_write(ops, ordered=False).modified_count
+    return updated
+
+# ==============================
+# Estadísticas de accesos (rollups)
+# ==============================
+
+# Límites superiores (m) de los buckets de precisión para estimar percentiles
+ACC_BUCKETS = (5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def _acc_bucket(acc):
+    """Bucket de precisión ("le_<límite>" o "gt_<máx>"), None si no es numérica."""
+    if not isinstance(acc, (int, float)):
+        return None
+    for edge in ACC_BUCKETS:
+        if acc <= edge:
+            return f"le_{edge}"
+    return f"gt_{ACC_BUCKETS[-1]}"
+
+
+def access_stats_updates(docs):
+    """
+    Construye los $inc/$addToSet por período (hora y día, hora Bogotá)
+    para un lote de documentos de access_log.
+    Retorna {(_id, period, start): {"$inc": {...}, "cells": set()}}.
+    """
+    updates = {}
+    for doc in docs:
+        ts = doc["ts"]
+        if ts.tzinfo is None:
+            ts = ts.replace(tzinfo=pytz.UTC)  # leídos de Mongo: UTC naive
+        local = ts.astimezone(colombia)
+        periods = (
+            ("hour", local.replace(minute=0, second=0, microsecond=0)),
+            ("day", local.replace(hour=0, minute=0, second=0, microsecond=0)),
+        )
+        acc = doc.get("acc")
+        bucket = _acc_bucket(acc)
+        cell = celda_grilla(doc.get("lat"), doc.get("lon"))
+
+        for period, start in periods:
+            key = (f"{period}:{start.strftime('%Y-%m-%dT%H')}", period, start)
+            entry = updates.setdefault(key, {"$inc": {}, "cells": set()})
+            inc = entry["$inc"]
+            inc["count"] = inc.get("count", 0) + 1
+            if cell:
+                inc["with_location"] = inc.get("with_location", 0) + 1
+                entry["cells"].add(cell)
+            if bucket:
+                inc["acc_sum"] = inc.get("acc_sum", 0) + acc
+                inc["acc_n"] = inc.get("acc_n", 0) + 1
+                inc[f"acc_hist.{bucket}"] = inc.get(f"acc_hist.{bucket}", 0) + 1
+    return updates
+
+
+@timed("db.update_access_stats")
+def update_access_stats(docs):
+    """
+    Actualiza incrementalmente la colección `access_stats` con $inc upserts
+    (un documento por hora y por día) para los accesos recibidos.
+    """
+    db = get_db()
+    if db is None or not docs:
+        return
+    ops = access_stats_ops(docs)
+    if ops:
+        db.access_stats.bulk_write(ops, ordered=False)
+
+
+def access_stats_ops(docs) -> list:
+    """Operaciones UpdateOne (upsert) de access_stats para un lote de accesos."""
+    ops = []
+    for (_id, period, start), entry in access_stats_updates(docs).items():
+        update = {
+            "$inc": entry["$inc"],
+            "$setOnInsert": {"period": period, "start": start},
+        }
+        if entry["cells"]:
+            update["$addToSet"] = {"cells": {"$each": sorted(entry["cells"])}}
+        ops.append(UpdateOne({"_id": _id}, update, upsert=True))
+    return ops
+
+
+@timed("db.get_access_stats")
+def get_access_stats(period="day", limit=30):
+    """
+    Devuelve los últimos `limit` rollups del período ("hour" o "day"),
+    ordenados cronológicamente.
+    """
+    db = get_db()
+    if db is not None:
+        rows = list(
+            db.access_stats.find({"period": period}).sort("start", -1).limit(limit)
+        )
+        rows.reverse()
+        return rows
+    return []
+
+
+def acc_percentile(acc_hist: dict, q: float):
+    """
+    Estima el percentil `q` (0-1) de precisión a partir del histograma
+    de buckets; devuelve el límite superior del bucket que lo contiene.
+    """
+    total = sum(acc_hist.values()) if acc_hist else 0
+    if not total:
+        return None
+    target = q * total
+    seen = 0
+    for edge in ACC_BUCKETS:
+        seen += acc_hist.get(f"le_{edge}", 0)
+        if seen >= target:
+            return edge
+    return float("inf")
+
+
+def rebuild_access_stats():
+    """
+    Reconstruye `access_stats` recorriendo `access_log` por lotes
+    (para inicializar o reparar los rollups).
+
+    Solo toca el rango que access_log aún cubre completo: la retención borra
+    logs crudos y conserva los rollups, así que los períodos anteriores se
+    dejan intactos, y también el día del log más antiguo si su rollup cuenta
+    más accesos que los logs que quedan (la retención ya podó parte del día).
+    Retorna la fecha desde la que se reconstruyó (None si no hay logs).
+    """
+    db = get_db()
+    if db is None:
+        return None
+    first = db.access_log.find_one({}, {"ts": 1}, sort=[("ts", ASCENDING)])
+    if first is None:
+        return None
+
+    ts = first["ts"]
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=pytz.UTC)  # pymongo devuelve UTC naive
+    since = ts.astimezone(colombia).replace(hour=0, minute=0, second=0, microsecond=0)
+    first_day = db.access_stats.find_one({"period": "day", "start": since}, {"count": 1})
+    if first_day is not None:
+        remaining = db.access_log.count_documents(
+            {"ts": {"$gte": since, "$lt": since + timedelta(days=1)}})
+        if first_day.get("count", 0) > remaining:
+            # Primer día recortado por la retención: conservar su rollup
+            since += timedelta(days=1)
+
+    db.access_stats.delete_many({"start": {"$gte": since}})
+    batch = []
+    for doc in db.access_log.find({"ts": {"$gte": since}}, ACCESS_LOG_FIELDS).batch_size(1000):
+        batch.append(doc)
+        if len(batch) >= 1000:
+            update_access_stats(batch)
+            batch = []
+    update_access_stats(batch)
+    return since
+
+# ==============================
+# Registro de fotos vigiladas (watches)
+# ==============================
+
+def add_watch(photo_url: str, *, label=None):
+    """
+    Registra una URL en la colección `watches` (si no existe ya).
+
+    Campos:
+      - photo_url  : URL vigilada
+      - label      : nombre opcional
+      - hash       : último hash conocido (None al crear)
+      - validators : validadores HTTP del último check
+      - phash      : último hash perceptual (si el modo está activo)
+      - checked_at : fecha del último check (UTC)
+      - active     : si se incluye en los barridos
+    """
+    db = get_db()
+    if db is not None:
+        db.watches.update_one(
+            {"photo_url": photo_url},
+            {"$setOnInsert": {
+                "photo_url": photo_url,
+                "label": label,
+                "hash": None,
+                "validators": None,
+                "phash": None,
+                "checked_at": None,
+                "active": True,
+            }},
+            upsert=True
+        )
+
+
+@timed("db.get_watches")
+def get_watches(active_only=True):
+    """
+    Devuelve la lista de URLs vigiladas desde la colección `watches`.
+    """
+    db = get_db()
+    if db is not None:
+        query = {"active": True} if active_only else {}
+        return list(db.watches.find(query))
+    return []
+
+
+@timed("db.update_watch_state")
+def update_watch_state(watch_id, *, hash_value=None, validators=None,
+                       checked_at=None, phash=None):
+    """
+    Actualiza el estado (último hash / validadores / fecha) de una URL vigilada.
+    Solo se modifican los campos recibidos.
+    """
+    db = get_db()
+    if db is not None:
+        changes = {"checked_at": checked_at or datetime.utcnow().replace(tzinfo=pytz.UTC)}
+        if hash_value is not None:
+            changes["hash"] = hash_value
+        if validators is not None:
+            changes["validators"] = validators
+        if phash is not None:
+            changes["phash"] = phash
+        db.watches.update_one({"_id": watch_id}, {"$set": changes})
+
 # ==============================
 # Fotos y verificación
 # ==============================
 
-def get_latest_record():
+# Caché del último registro por colección (proceso completo)
+LATEST_CACHE_TTL = float(os.environ.get("LATEST_CACHE_TTL", 60))
+
+_latest_cache = {}          # nombre de colección → (expira_en, registro)
+_latest_lock = threading.Lock()
+_latest_watchers = {}       # nombre de colección → hilo del change stream
+
+# Orden del "último registro": visto más recientemente, luego el último insertado
+LATEST_SORT = [("last_seen_at", -1), ("_id", -1)]
+
+
+def invalidate_latest_record(col_name=None):
+    """
+    Invalida la caché del último registro (de una colección o de todas).
+    """
+    with _latest_lock:
+        if col_name is None:
+            _latest_cache.clear()
+        else:
+            _latest_cache.pop(col_name, None)
+
+
+def cached_latest_record(col_name: str) -> tuple:
+    """(hit, registro) desde la caché del último registro (compartida con db_async)."""
+    with _latest_lock:
+        cached = _latest_cache.get(col_name)
+    if cached and cached[0] > time.monotonic():
+        return True, cached[1]
+    return False, None
+
+
+def store_latest_record(col_name: str, record):
+    with _latest_lock:
+        _latest_cache[col_name] = (time.monotonic() + LATEST_CACHE_TTL, record)
+
+
+def _watch_latest_record(col):
     """
-    Devuelve el último registro insertado en la colección principal (history).
+    Hilo que escucha el change stream de la colección e invalida la caché
+    en cada insert/update/delete. Si el servidor no soporta change streams
+    (p. ej. standalone sin réplica) termina y queda solo el TTL.
+    """
+    try:
+        with col.watch([{"$match": {"operationType": {"$in": [
+                "insert", "update", "replace", "delete"]}}}]) as stream:
+            for _change in stream:
+                invalidate_latest_record(col.name)
+    except PyMongoError as e:
+        print(f"ℹ️ Change stream no disponible para {col.name}, se usa TTL: {e}")
+    finally:
+        with _latest_lock:
+            _latest_watchers.pop(col.name, None)
+
+
+def _ensure_latest_watcher(col):
+    """Inicia (una vez) el change stream si está habilitado en [mongodb] change_streams."""
+    if not _mongo_config().get("change_streams"):
+        return
+    with _latest_lock:
+        if col.name in _latest_watchers:
+            return
+        thread = threading.Thread(target=_watch_latest_record, args=(col,),
+                                  name=f"latest-watch-{col.name}", daemon=True)
+        _latest_watchers[col.name] = thread
+    thread.start()
+
+
+@timed("db.get_latest_record")
+def get_latest_record(*, use_cache=True):
+    """
+    Devuelve el último registro visto en la colección principal (history):
+    el de last_seen_at más reciente (o el último insertado si no hay).
+
+    El resultado se cachea por proceso: se invalida al insertar/actualizar
+    desde este proceso, por change stream (si mongodb.change_streams = true)
+    y, en todo caso, tras LATEST_CACHE_TTL segundos.
+    El dict devuelto es compartido: no modificarlo.
     """
     col = get_collection()
-    if col is not None:
-        return col.find_one(sort=[("_id", -1)])
-    return None
+    if col is None:
+        return None
+
+    if use_cache:
+        _ensure_latest_watcher(col)
+        hit, record = cached_latest_record(col.name)
+        if hit:
+            return record
 
+    record = col.find_one(sort=LATEST_SORT)
+    store_latest_record(col.name, record)
+    return record
 
+
+def photo_record_document(photo_url, hash_value, *, checked_at=None, geo_data=None,
+                          validators=None, phash=None) -> dict:
+    """
+    Documento de historial normalizado: checked_at en UTC, geodatos con
+    punto GeoJSON, validadores HTTP y hash perceptual solo si se pasan.
+    """
+    # Normalizar fecha → siempre UTC
+    if checked_at is None:
+        checked_at = datetime.utcnow().replace(tzinfo=pytz.UTC)
+    elif checked_at.tzinfo is None:
+        checked_at = checked_at.replace(tzinfo=pytz.UTC)
+    else:
+        checked_at = checked_at.astimezone(pytz.UTC)
+
+    # Construcción del documento
+    record = {
+        "photo_url": photo_url,
+        "hash": hash_value,
+        "checked_at": checked_at,  # UTC estándar
+    }
+
+    # Si hay geodatos, anexar
+    if geo_data:
+        record["lat"] = geo_data.get("lat")
+        record["lon"] = geo_data.get("lon")
+        record["acc"] = geo_data.get("acc")
+        loc = geo_point(record["lat"], record["lon"])
+        if loc:
+            record["loc"] = loc
+
+    # Validadores HTTP para descargas condicionales
+    if validators:
+        record["validators"] = validators
+
+    # Hash perceptual (solo si el modo está activo)
+    if phash:
+        record["phash"] = phash
+    return record
+
+
+def photo_record_upsert(record: dict) -> tuple:
+    """
+    (filtro, update) del upsert idempotente por (photo_url, hash):
+    al insertar guarda el documento; si ya existe solo actualiza
+    last_seen_at / validators y suma seen_count.
+    """
+    seen = {"last_seen_at": record["checked_at"]}
+    if record.get("validators"):
+        seen["validators"] = record["validators"]
+    on_insert = {k: v for k, v in record.items()
+                 if k not in ("photo_url", "hash") and k not in seen}
+    return (
+        {"photo_url": record["photo_url"], "hash": record["hash"]},
+        {"$setOnInsert": on_insert, "$set": seen, "$inc": {"seen_count": 1}},
+    )
+
+
+@timed("db.insert_photo_record")
 def insert_photo_record(photo_url: str,
                         hash_value: str,
                         *,
                         checked_at=None,
-                        geo_data=None):
+                        geo_data=None,
+                        validators=None,
+                        phash=None,
+                        buffered=False):
     """
-    Inserta un nuevo registro en la colección principal (history).
+    Inserta un registro en la colección principal (history) de forma
+    idempotente: la clave única es (photo_url, hash). Si ya existe, solo
+    actualiza last_seen_at, validators y suma seen_count.
 
     Parámetros:
         photo_url (str)   : URL de la foto
         hash_value (str)  : hash SHA256 de la foto o URL
         checked_at (datetime|None): fecha de verificación.
         geo_data (dict|None): datos opcionales de ubicación.
+        validators (dict|None): validadores HTTP (etag, last_modified,
+            content_length) para verificaciones condicionales.
+        phash (str|None): hash perceptual (aHash/dHash/pHash) de la imagen.
+        buffered (bool): si True, se encola en el buffer de escritura
+            (para barridos masivos) en vez de escribir de inmediato.
+
+    Retorna True si se insertó un registro nuevo, False si ya existía
+    (None si no hay DB o si se encoló en el buffer).
     """
     col = get_collection()
     if col is not None:
-        # Normalizar fecha → siempre UTC
-        if checked_at is None:
-            checked_at = datetime.utcnow().replace(tzinfo=pytz.UTC)
-        elif checked_at.tzinfo is None:
-            checked_at = checked_at.replace(tzinfo=pytz.UTC)
-        else:
-            checked_at = checked_at.astimezone(pytz.UTC)
+        record = photo_record_document(photo_url, hash_value, checked_at=checked_at,
+                                       geo_data=geo_data, validators=validators, phash=phash)
 
-        # Construcción del documento
-        record = {
-            "photo_url": photo_url,
-            "hash": hash_value,
-            "checked_at": checked_at,  # UTC estándar
-        }
+        # Insertar en Mongo (idempotente por photo_url + hash)
+        if buffered:
+            # En lote: el mismo upsert (si ya existe, suma seen_count y last_seen_at)
+            get_write_buffer().add("history", UpdateOne(*photo_record_upsert(record), upsert=True))
+            return None
+
+        result = col.update_one(*photo_record_upsert(record), upsert=True)
+        invalidate_latest_record(col.name)
+        inserted = result.upserted_id is not None
+        estado = "insertado" if inserted else "ya existía"
+        print(f"✅ insert_photo_record OK ({estado}): {photo_url[:40]}... {hash_value[:10]}")
+        return inserted
+    return None
+
+
+@timed("db.mark_photo_seen")
+def mark_photo_seen(record_id, *, validators=None, seen_at=None):
+    """
+    Marca un registro como visto de nuevo sin insertar otro:
+    actualiza last_seen_at, incrementa seen_count y, si se pasan,
+    refresca los validadores HTTP (ETag / Last-Modified / Content-Length).
+    """
+    col = get_collection()
+    if col is not None:
+        col.update_one({"_id": record_id}, photo_seen_update(validators, seen_at))
+        invalidate_latest_record(col.name)
+
+
+def photo_seen_update(validators=None, seen_at=None) -> dict:
+    """Update de mark_photo_seen: last_seen_at, seen_count y validadores opcionales."""
+    changes = {"last_seen_at": seen_at or datetime.utcnow().replace(tzinfo=pytz.UTC)}
+    if validators:
+        changes["validators"] = validators
+    return {"$set": changes, "$inc": {"seen_count": 1}}
+
+
+def dedupe_history():
+    """
+    Migración: fusiona registros duplicados (mismo photo_url + hash) para
+    poder crear el índice único. Conserva el más antiguo, suma seen_count
+    y deja el last_seen_at más reciente. Retorna la cantidad eliminada.
+    """
+    col = get_collection()
+    if col is None:
+        return 0
+
+    pipeline = [
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"photo_url": "$photo_url", "hash": "$hash"},
+            "ids": {"$push": "$_id"},
+            "seen": {"$sum": {"$ifNull": ["$seen_count", 1]}},
+            "last": {"$max": {"$ifNull": ["$last_seen_at", "$checked_at"]}},
+        }},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ]
+    removed = 0
+    for group in col.aggregate(pipeline, allowDiskUse=True):
+        keep, extra = group["ids"][0], group["ids"][1:]
+        col.update_one({"_id": keep}, {"$set": {"seen_count": group["seen"],
+                                                "last_seen_at": group["last"]}})
+        removed += col.delete_many({"_id": {"$in": extra}}).deleted_count
+    invalidate_latest_record(col.name)
+    return removed
 
-        # Si hay geodatos, anexar
-        if geo_data:
-            record["lat"] = geo_data.get("lat")
-            record["lon"] = geo_data.get("lon")
-            record["acc"] = geo_data.get("acc")
 
-        # Insertar en Mongo
-        col.insert_one(record)
-        print(f"✅ insert_photo_record OK: {photo_url[:40]}... {hash_value[:10]}")
\ No newline at end of file
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,152 @@
+# db_async.py
+# ==============================
+# Variante asyncio de db.py (AsyncMongoClient de PyMongo)
+#
+# Mismas operaciones para verificadores / APIs concurrentes:
+#   get_latest_record, insert_photo_record, mark_photo_seen,
+#   insert_access_log, get_access_logs
+# La configuración, los documentos y los updates se comparten con db.py;
+# la caché del último registro también (se invalida desde ambos lados).
+# ==============================
+
+import asyncio
+import os
+import weakref
+from pymongo import AsyncMongoClient
+
+import config
+import db
+from metrics import timed
+
+# ==============================
+# Conexión MongoDB
+# ==============================
+
+# Un AsyncMongoClient queda atado al event loop donde se usa por primera vez
+_clients = weakref.WeakKeyDictionary()   # event loop → cliente
+
+
+def get_client():
+    """
+    Cliente async del event loop actual (se crea al primer uso, con las
+    mismas opciones de pool que db.get_client()). None si no hay URI.
+    """
+    cfg = config.section("mongodb")
+    if not cfg.get("uri"):
+        return None
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncMongoClient(cfg["uri"], **db.client_options(cfg))
+    return client
+
+
+async def close_client():
+    """Cierra el cliente del event loop actual (al terminar el loop)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def get_db():
+    client = get_client()
+    if client is not None:
+        return client[config.section("mongodb")["db"]]
+    return None
+
+
+def get_collection():
+    db_ = get_db()
+    if db_ is not None:
+        return db_[config.section("mongodb")["collection"]]
+    return None
+
+
+def _reset_after_fork():
+    _clients.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+# ==============================
+# Logs de accesos
+# ==============================
+
+@timed("db_async.insert_access_log")
+async def insert_access_log(lat, lon, acc):
+    """
+    Inserta un registro en `access_log` y actualiza los rollups (access_stats).
+    Sin buffer: cada llamada ya libera el loop mientras espera al servidor.
+    """
+    db_ = get_db()
+    if db_ is None:
+        return
+    doc = db.access_log_document(lat, lon, acc)
+    await db_.access_log.insert_one(doc)
+    ops = db.access_stats_ops([doc])
+    if ops:
+        await db_.access_stats.bulk_write(ops, ordered=False)
+
+
+@timed("db_async.get_access_logs")
+async def get_access_logs(limit=db.DEFAULT_LOG_WINDOW, *, since=None, until=None,
+                          fields=db.ACCESS_LOG_FIELDS):
+    """Igual que db.get_access_logs(): últimos `limit` registros en orden ascendente."""
+    db_ = get_db()
+    if db_ is None:
+        return []
+    cursor = db_.access_log.find(db.time_window(since, until), fields).sort("ts", -1)
+    if limit:
+        cursor = cursor.limit(limit)
+    logs = await cursor.to_list()
+    logs.reverse()
+    return logs
+
+# ==============================
+# Fotos y verificación
+# ==============================
+
+@timed("db_async.get_latest_record")
+async def get_latest_record(*, use_cache=True):
+    """
+    Igual que db.get_latest_record(): último registro visto en history,
+    con la misma caché por proceso (TTL / invalidación al escribir).
+    """
+    col = get_collection()
+    if col is None:
+        return None
+    if use_cache:
+        hit, record = db.cached_latest_record(col.name)
+        if hit:
+            return record
+
+    record = await col.find_one(sort=db.LATEST_SORT)
+    db.store_latest_record(col.name, record)
+    return record
+
+
+@timed("db_async.insert_photo_record")
+async def insert_photo_record(photo_url: str, hash_value: str, *, checked_at=None,
+                              geo_data=None, validators=None, phash=None):
+    """
+    Igual que db.insert_photo_record() (upsert idempotente por photo_url + hash).
+    Retorna True si se insertó, False si ya existía, None si no hay DB.
+    """
+    col = get_collection()
+    if col is None:
+        return None
+    record = db.photo_record_document(photo_url, hash_value, checked_at=checked_at,
+                                      geo_data=geo_data, validators=validators, phash=phash)
+    result = await col.update_one(*db.photo_record_upsert(record), upsert=True)
+    db.invalidate_latest_record(col.name)
+    return result.upserted_id is not None
+
+
+@timed("db_async.mark_photo_seen")
+async def mark_photo_seen(record_id, *, validators=None, seen_at=None):
+    """Igual que db.mark_photo_seen(): last_seen_at, seen_count y validadores."""
+    col = get_collection()
+    if col is not None:
+        await col.update_one({"_id": record_id}, db.photo_seen_update(validators, seen_at))
+        db.invalidate_latest_record(col.name)
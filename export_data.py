@@ -0,0 +1,277 @@
+# export_data.py
+# ============================================
+# Exportación / importación masiva de `history` y `access_log` en Parquet.
+#
+# Uso:
+#   python export_data.py export access_log --out exports/
+#   python export_data.py export history --out exports/ --since-ts 2026-01-01
+#   python export_data.py import access_log exports/access_log/*.parquet
+#
+# La exportación lee con cursor del servidor (batch_size) ordenado por _id y
+# escribe archivos parciales; tras cerrar cada archivo guarda un checkpoint
+# (último _id) para reanudar o exportar solo lo nuevo en la siguiente corrida.
+# ============================================
+
+import argparse
+import glob
+import json
+import os
+from datetime import datetime
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytz
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from db import get_db, get_collection
+
+BATCH_SIZE = 10000          # documentos por lote leído de Mongo
+ROWS_PER_FILE = 500000      # filas por archivo Parquet
+
+TS = pa.timestamp("us", tz="UTC")
+
+# Esquemas explícitos (estables entre lotes). Los dicts anidados van como JSON.
+SCHEMAS = {
+    "access_log": pa.schema([
+        ("_id", pa.string()),
+        ("ts", TS),
+        ("lat", pa.float64()),
+        ("lon", pa.float64()),
+        ("acc", pa.float64()),
+    ]),
+    "history": pa.schema([
+        ("_id", pa.string()),
+        ("photo_url", pa.string()),
+        ("hash", pa.string()),
+        ("checked_at", TS),
+        ("last_seen_at", TS),
+        ("seen_count", pa.int64()),
+        ("lat", pa.float64()),
+        ("lon", pa.float64()),
+        ("acc", pa.float64()),
+        ("phash", pa.string()),
+        ("validators", pa.string()),
+    ]),
+}
+JSON_FIELDS = {"validators"}
+TIME_FIELDS = {"ts", "checked_at", "last_seen_at"}
+
+# ==============================
+# Conversión documento ↔ fila
+# ==============================
+def _number(value):
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def to_columns(docs, schema) -> dict:
+    """Convierte una lista de documentos en columnas según `schema`."""
+    columns = {name: [] for name in schema.names}
+    for doc in docs:
+        for field in schema:
+            value = doc.get(field.name)
+            if field.name == "_id":
+                value = str(value)
+            elif field.name in JSON_FIELDS:
+                value = json.dumps(value, default=str) if value is not None else None
+            elif field.name in TIME_FIELDS:
+                if isinstance(value, datetime) and value.tzinfo is None:
+                    value = value.replace(tzinfo=pytz.UTC)  # pymongo devuelve UTC naive
+                elif not isinstance(value, datetime):
+                    value = None
+            elif pa.types.is_floating(field.type):
+                value = _number(value)
+            elif pa.types.is_integer(field.type):
+                value = int(value) if isinstance(value, (int, float)) else None
+            elif value is not None:
+                value = str(value)
+            columns[field.name].append(value)
+    return columns
+
+
+def to_documents(rows) -> list:
+    """Convierte filas leídas de Parquet en documentos para Mongo."""
+    docs = []
+    for row in rows:
+        doc = {}
+        for key, value in row.items():
+            if value is None:
+                continue
+            if key == "_id":
+                value = ObjectId(value) if ObjectId.is_valid(value) else value
+            elif key in JSON_FIELDS:
+                value = json.loads(value)
+            doc[key] = value
+        if isinstance(doc.get("lat"), float) and isinstance(doc.get("lon"), float):
+            doc["loc"] = {"type": "Point", "coordinates": [doc["lon"], doc["lat"]]}
+        docs.append(doc)
+    return docs
+
+# ==============================
+# Checkpoint
+# ==============================
+def checkpoint_path(out_dir: str, name: str) -> str:
+    return os.path.join(out_dir, name, "_checkpoint.json")
+
+
+def load_checkpoint(out_dir: str, name: str) -> dict:
+    try:
+        with open(checkpoint_path(out_dir, name), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"last_id": None, "files": []}
+
+
+def save_checkpoint(out_dir: str, name: str, checkpoint: dict):
+    path = checkpoint_path(out_dir, name)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp, path)
+
+# ==============================
+# Exportación
+# ==============================
+def _resolve_collection(name: str):
+    if name == "history":
+        return get_collection()
+    db = get_db()
+    return db[name] if db is not None else None
+
+
+def export_collection(name: str, out_dir: str, *, since_ts=None,
+                      batch_size=BATCH_SIZE, rows_per_file=ROWS_PER_FILE) -> int:
+    """
+    Exporta la colección `name` a archivos Parquet en <out_dir>/<name>/.
+    Continúa desde el checkpoint (último _id exportado) si existe.
+    Retorna la cantidad de documentos exportados en esta corrida.
+    """
+    col = _resolve_collection(name)
+    if col is None:
+        raise RuntimeError("MongoDB no configurado")
+    schema = SCHEMAS[name]
+    os.makedirs(os.path.join(out_dir, name), exist_ok=True)
+
+    checkpoint = load_checkpoint(out_dir, name)
+    query = {}
+    if checkpoint["last_id"]:
+        query["_id"] = {"$gt": ObjectId(checkpoint["last_id"])}
+    if since_ts is not None:
+        query["ts" if name == "access_log" else "checked_at"] = {"$gte": since_ts}
+
+    cursor = col.find(query).sort("_id", 1).batch_size(batch_size)
+
+    exported = 0
+    writer = None
+    tmp_path = final_path = None
+    rows_in_file = 0
+    last_id = None
+    batch = []
+
+    def close_file(last_id):
+        nonlocal writer, rows_in_file
+        writer.close()
+        os.replace(tmp_path, final_path)
+        checkpoint["last_id"] = str(last_id)
+        checkpoint["files"].append(os.path.basename(final_path))
+        save_checkpoint(out_dir, name, checkpoint)
+        writer, rows_in_file = None, 0
+
+    def write_batch():
+        nonlocal writer, tmp_path, final_path, rows_in_file, exported, last_id
+        if writer is None:
+            stamp = datetime.now(pytz.UTC).strftime("%Y%m%dT%H%M%S")
+            final_path = os.path.join(out_dir, name,
+                                      f"part-{stamp}-{len(checkpoint['files']):05d}.parquet")
+            tmp_path = f"{final_path}.tmp"
+            writer = pq.ParquetWriter(tmp_path, schema, compression="zstd")
+        writer.write_table(pa.Table.from_pydict(to_columns(batch, schema), schema=schema))
+        rows_in_file += len(batch)
+        exported += len(batch)
+        last_id = batch[-1]["_id"]
+        if rows_in_file >= rows_per_file:
+            close_file(last_id)
+
+    try:
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                write_batch()
+                batch = []
+        if batch:
+            write_batch()
+        if writer is not None:
+            close_file(last_id)
+    finally:
+        cursor.close()
+        if writer is not None:  # corrida interrumpida → descartar archivo incompleto
+            writer.close()
+            os.remove(tmp_path)
+    return exported
+
+# ==============================
+# Importación
+# ==============================
+def import_files(name: str, paths, *, batch_size=BATCH_SIZE) -> int:
+    """
+    Importa archivos Parquet a la colección `name` con insert_many(ordered=False).
+    Los _id ya existentes se omiten (reimportar es idempotente).
+    Retorna la cantidad de documentos insertados.
+    """
+    col = _resolve_collection(name)
+    if col is None:
+        raise RuntimeError("MongoDB no configurado")
+
+    inserted = 0
+    for path in paths:
+        parquet = pq.ParquetFile(path)
+        for record_batch in parquet.iter_batches(batch_size=batch_size):
+            docs = to_documents(record_batch.to_pylist())
+            if not docs:
+                continue
+            try:
+                inserted += len(col.insert_many(docs, ordered=False).inserted_ids)
+            except BulkWriteError as e:
+                inserted += e.details.get("nInserted", 0)
+                real = [w for w in e.details.get("writeErrors", []) if w.get("code") != 11000]
+                if real:
+                    raise
+    return inserted
+
+# ==============================
+# CLI
+# ==============================
+def main():
+    parser = argparse.ArgumentParser(description="Exportar / importar historial en Parquet")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    exp = sub.add_parser("export", help="Exportar una colección a Parquet")
+    exp.add_argument("collection", choices=sorted(SCHEMAS))
+    exp.add_argument("--out", default="exports", help="Directorio de salida")
+    exp.add_argument("--since-ts", default=None,
+                     help="Solo documentos desde esta fecha (ISO, UTC)")
+    exp.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    exp.add_argument("--rows-per-file", type=int, default=ROWS_PER_FILE)
+
+    imp = sub.add_parser("import", help="Importar archivos Parquet a una colección")
+    imp.add_argument("collection", choices=sorted(SCHEMAS))
+    imp.add_argument("files", nargs="+", help="Archivos .parquet (acepta comodines)")
+    imp.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        since = None
+        if args.since_ts:
+            since = datetime.fromisoformat(args.since_ts)
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=pytz.UTC)
+        n = export_collection(args.collection, args.out, since_ts=since,
+                              batch_size=args.batch_size, rows_per_file=args.rows_per_file)
+        print(f"✅ {n} documentos exportados de {args.collection}")
+    else:
+        paths = sorted(p for pattern in args.files for p in glob.glob(pattern))
+        n = import_files(args.collection, paths, batch_size=args.batch_size)
+        print(f"✅ {n} documentos importados en {args.collection}")
+
+
+if __name__ == "__main__":
+    main()
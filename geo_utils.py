@@ -1,4 +1,6 @@
 # geo_utils.py
+# (NumPy se importa dentro de las funciones *_vec: db.py usa celda_grilla
+#  y no debe cargar NumPy al arrancar)
 
 # ---------------------------
 # Funciones de conversión de coordenadas
@@ -38,3 +40,130 @@ def formato_gms_con_hemisferio(lat, lon):
     lat_str = f"{abs(lat_g)}° {lat_m}' {lat_s:.2f}\" {lat_h}"
     lon_str = f"{abs(lon_g)}° {lon_m}' {lon_s:.2f}\" {lon_h}"
     return lat_str, lon_str
+
+
+# ---------------------------
+# Celdas de ubicación
+# ---------------------------
+
+def celda_grilla(lat, lon, decimales=3):
+    """
+    Devuelve la celda de grilla de una coordenada redondeando a `decimales`
+    (3 decimales ≈ 110 m). Retorna None si falta lat o lon.
+    """
+    if lat is None or lon is None:
+        return None
+    return f"{round(lat, decimales):.{decimales}f},{round(lon, decimales):.{decimales}f}"
+
+
+# ---------------------------
+# Versiones vectorizadas (NumPy, importado al primer uso)
+# ---------------------------
+
+def decimal_a_gms_vec(coords):
+    """
+    Igual que decimal_a_gms pero para arrays: retorna (grados, minutos, segundos)
+    como arrays. Los NaN se propagan en segundos y quedan 0 en grados/minutos.
+    """
+    import numpy as np
+    coords = np.asarray(coords, dtype=float)
+    validos = np.isfinite(coords)
+    limpios = np.where(validos, coords, 0.0)
+    grados = np.trunc(limpios)
+    minutos_dec = np.abs(limpios - grados) * 60
+    minutos = np.trunc(minutos_dec)
+    segundos = np.where(validos, (minutos_dec - minutos) * 60, np.nan)
+    return grados.astype(int), minutos.astype(int), segundos
+
+
+def _gms_str_vec(coords, positivo, negativo):
+    import numpy as np
+    coords = np.asarray(coords, dtype=float)
+    grados, minutos, segundos = decimal_a_gms_vec(coords)
+    hemisferio = np.where(coords >= 0, positivo, negativo)
+    texto = (np.char.mod("%d", np.abs(grados)).astype(object) + "° "
+             + np.char.mod("%d", minutos).astype(object) + "' "
+             + np.char.mod("%.2f", np.nan_to_num(segundos)).astype(object) + '" '
+             + hemisferio.astype(object))
+    return np.where(np.isfinite(coords), texto, None)
+
+
+def formato_gms_vec(lats, lons):
+    """
+    Igual que formato_gms_con_hemisferio pero para arrays de lat/lon.
+    Retorna (latitudes_str, longitudes_str) como arrays (None donde falte el dato).
+    """
+    return _gms_str_vec(lats, "N", "S"), _gms_str_vec(lons, "E", "W")
+
+
+def formato_decimal_vec(coords, decimales=6):
+    """
+    Formatea un array de coordenadas con `decimales` decimales.
+    Retorna un array de strings (None donde falte el dato o sea 0).
+    """
+    import numpy as np
+    coords = np.asarray(coords, dtype=float)
+    texto = np.char.mod(f"%.{decimales}f", np.nan_to_num(coords)).astype(object)
+    return np.where(np.isfinite(coords) & (coords != 0), texto, None)
+
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_vec(lats, lons, precision=7):
+    """
+    Codifica arrays de lat/lon a geohash (precision 7 ≈ 150 m) en bloque.
+    Retorna un array de strings (None donde falte el dato).
+    """
+    import numpy as np
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    validos = np.isfinite(lats) & np.isfinite(lons)
+
+    total_bits = 5 * precision
+    lon_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+
+    # Cuantizar cada eje a un entero de lon_bits / lat_bits bits
+    lon_q = np.clip(((np.nan_to_num(lons) + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64),
+                    0, (1 << lon_bits) - 1)
+    lat_q = np.clip(((np.nan_to_num(lats) + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64),
+                    0, (1 << lat_bits) - 1)
+
+    # Intercalar bits: lon, lat, lon, lat... (empezando por el más significativo)
+    code = np.zeros(lats.shape, dtype=np.int64)
+    for i in range(total_bits):
+        if i % 2 == 0:
+            bit = (lon_q >> (lon_bits - 1 - i // 2)) & 1
+        else:
+            bit = (lat_q >> (lat_bits - 1 - i // 2)) & 1
+        code = (code << 1) | bit
+
+    # Bloques de 5 bits → caracteres base32 (concatenados como arrays)
+    alfabeto = np.array(list(_GEOHASH_BASE32))
+    hashes = np.full(lats.shape, "", dtype=object)
+    for k in range(precision):
+        hashes = hashes + alfabeto[(code >> (5 * (precision - 1 - k))) & 31].astype(object)
+    return np.where(validos, hashes, None)
+
+
+def agrupar_ubicaciones(lats, lons, precision=7, minimo=1):
+    """
+    Agrupa puntos por celda geohash para detectar ubicaciones repetidas.
+    Retorna lista de (geohash, cantidad, lat_media, lon_media) ordenada de
+    mayor a menor, solo con celdas que tengan al menos `minimo` puntos.
+    """
+    import numpy as np
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    celdas = geohash_vec(lats, lons, precision)
+    validos = celdas != None  # noqa: E711
+    if not validos.any():
+        return []
+    unicas, inversa, conteos = np.unique(celdas[validos].astype(str),
+                                         return_inverse=True, return_counts=True)
+    lat_media = np.bincount(inversa, weights=lats[validos]) / conteos
+    lon_media = np.bincount(inversa, weights=lons[validos]) / conteos
+    orden = np.argsort(-conteos, kind="stable")
+    return [(str(unicas[i]), int(conteos[i]), float(lat_media[i]), float(lon_media[i]))
+            for i in orden if conteos[i] >= minimo]
@@ -2,7 +2,9 @@
 from streamlit_js_eval import get_geolocation
 import streamlit as st
 from db import insert_access_log
+from metrics import timed, track
 
+@timed("geolocation.handle_geolocation")
 def handle_geolocation(state):
     """
     Detecta la ubicación del usuario usando el navegador.
@@ -18,7 +20,8 @@ def handle_geolocation(state):
 
     # Solo ejecutar si no se ha registrado el acceso
     if not state.access_logged:
-        geo = get_geolocation()
+        with track("geolocation.get_geolocation"):
+            geo = get_geolocation()
         if geo:
             if "coords" in geo:
                 lat = geo["coords"]["latitude"]
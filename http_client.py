@@ -0,0 +1,86 @@
+# http_client.py
+# ============================================
+# Cliente HTTP compartido: pool de conexiones, keep-alive y reintentos
+# ============================================
+
+import os
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ==============================
+# Configuración (variables de entorno)
+# ==============================
+CONNECT_TIMEOUT = float(os.environ.get("HTTP_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("HTTP_READ_TIMEOUT", 10))
+MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", 3))
+BACKOFF_FACTOR = float(os.environ.get("HTTP_BACKOFF_FACTOR", 0.5))
+POOL_HOSTS = int(os.environ.get("HTTP_POOL_HOSTS", 20))         # hosts distintos en el pool
+POOL_PER_HOST = int(os.environ.get("HTTP_POOL_PER_HOST", 10))   # conexiones por host
+
+USER_AGENT = "photo-update/1.0"
+
+_session = None
+_lock = threading.Lock()
+
+# ==============================
+# Sesión compartida
+# ==============================
+def build_session() -> requests.Session:
+    """
+    Crea una sesión con pool de conexiones y reintentos con backoff
+    para errores 5xx, timeouts y fallos de conexión (solo GET/HEAD).
+    """
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_HOSTS,
+        pool_maxsize=POOL_PER_HOST,
+        pool_block=True,   # no abrir más de POOL_PER_HOST conexiones por host
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """
+    Devuelve la sesión HTTP del proceso (se crea una sola vez).
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def _reset_after_fork():
+    """El hijo de un fork no reutiliza las conexiones keep-alive del padre."""
+    global _session, _lock
+    _session = None
+    _lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def http_get(url: str, **kwargs) -> requests.Response:
+    """
+    GET usando la sesión compartida, con timeouts separados
+    de conexión y lectura por defecto.
+    """
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    return get_session().get(url, **kwargs)
@@ -0,0 +1,184 @@
+# image_cache.py
+# ============================================
+# Caché local de imágenes direccionada por contenido (SHA-256)
+# ============================================
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+# ==============================
+# Configuración (variables de entorno)
+# ==============================
+CACHE_DIR = os.environ.get(
+    "PHOTO_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "photo-update", "images")
+)
+CACHE_MAX_BYTES = int(os.environ.get("PHOTO_CACHE_MAX_BYTES", 500 * 1024 * 1024))
+# Al superar el límite se expulsa hasta esta fracción (margen antes del próximo recorrido)
+CACHE_EVICT_TARGET = 0.9
+
+# Cada cuánto (s) se vuelve a medir el directorio completo (otros procesos
+# también escriben en la caché y el contador local no los ve)
+CACHE_RESCAN_SECONDS = float(os.environ.get("PHOTO_CACHE_RESCAN_SECONDS", 300))
+
+_evict_lock = threading.Lock()
+_cache_bytes = None      # tamaño estimado de la caché (None = sin medir)
+_scanned_at = 0.0
+
+# ==============================
+# Rutas
+# ==============================
+def cache_path(hash_value: str, variant=None) -> str:
+    """
+    Ruta del archivo para un hash: <CACHE_DIR>/ab/abcdef...
+    (subcarpeta con los 2 primeros caracteres para no saturar un directorio).
+    Las variantes (p. ej. miniaturas "w256.webp") se guardan como abcdef....w256.webp
+    """
+    name = f"{hash_value}.{variant}" if variant else hash_value
+    return os.path.join(CACHE_DIR, hash_value[:2], name)
+
+
+def _is_valid_hash(hash_value) -> bool:
+    return (isinstance(hash_value, str) and len(hash_value) == 64
+            and all(c in "0123456789abcdef" for c in hash_value))
+
+# ==============================
+# Lectura
+# ==============================
+def get_cached(hash_value: str, variant=None):
+    """
+    Devuelve los bytes de la imagen con ese hash, o None si no está en caché.
+    Actualiza la fecha de acceso (LRU).
+    Lectura simple en un solo read(): los llamadores (Pillow, st.image) necesitan
+    bytes, así que un mmap terminaría copiándose igual.
+    """
+    if not _is_valid_hash(hash_value):
+        return None
+    path = cache_path(hash_value, variant)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data:
+            return None
+        os.utime(path)  # marcar como usado recientemente
+        return data
+    except OSError:
+        return None
+
+# ==============================
+# Escritura
+# ==============================
+def put_cached(content: bytes, hash_value=None, variant=None) -> str:
+    """
+    Guarda bytes en la caché y devuelve su hash SHA-256.
+    Si se pasa hash_value se confía en él (ya calculado por el llamador).
+    Con `variant` se guarda una versión derivada del original con ese hash.
+    """
+    if hash_value is None:
+        hash_value = hashlib.sha256(content).hexdigest()
+    writer = CacheWriter()
+    writer.write(content)
+    writer.commit(hash_value, variant)
+    return hash_value
+
+
+class CacheWriter:
+    """
+    Escritura incremental a un archivo temporal que se publica
+    atómicamente con su hash al final (commit). Permite llenar la caché
+    mientras se descarga en streaming.
+    """
+
+    def __init__(self):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, self.tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".part")
+        self._file = os.fdopen(fd, "wb")
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self, hash_value: str, variant=None):
+        """Publica el archivo con su hash y aplica la política de tamaño."""
+        self._file.close()
+        path = cache_path(hash_value, variant)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            replaced = os.stat(path).st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(self.tmp_path, path)
+        _account(self.size - replaced)
+
+    def abort(self):
+        """Descarta el archivo temporal (descarga fallida o inválida)."""
+        self._file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+# ==============================
+# Expulsión LRU por tamaño
+# ==============================
+def _account(delta: int):
+    """
+    Suma `delta` bytes al tamaño estimado y recorre el directorio (evict)
+    solo si se supera el límite, si aún no se midió o si la medición es vieja.
+    """
+    global _cache_bytes
+    with _evict_lock:
+        stale = (_cache_bytes is None
+                 or time.monotonic() - _scanned_at > CACHE_RESCAN_SECONDS)
+        if not stale:
+            _cache_bytes += delta
+            if _cache_bytes <= CACHE_MAX_BYTES:
+                return
+    evict(int(CACHE_MAX_BYTES * CACHE_EVICT_TARGET))
+
+
+def evict(max_bytes: int = None) -> int:
+    """
+    Si la caché supera `max_bytes`, elimina los archivos usados hace más
+    tiempo (por mtime, que get_cached actualiza) hasta quedar por debajo.
+    Retorna el tamaño resultante (y actualiza el tamaño estimado).
+    """
+    global _cache_bytes, _scanned_at
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _evict_lock:
+        _cache_bytes, _scanned_at = _evict(max_bytes), time.monotonic()
+        return _cache_bytes
+
+
+def _evict(max_bytes: int) -> int:
+    """Recorre la caché, borra por LRU hasta max_bytes y retorna el tamaño final."""
+    entries = []
+    total = 0
+    for root, _dirs, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".part"):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st_ = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((st_.st_mtime, st_.st_size, path))
+            total += st_.st_size
+
+    if total <= max_bytes:
+        return total
+
+    for _mtime, size, path in sorted(entries):
+        try:
+            os.remove(path)
+            total -= size
+        except FileNotFoundError:
+            pass
+        if total <= max_bytes:
+            break
+    return total
@@ -3,20 +3,29 @@
 # Importaciones
 # ==============================
 import streamlit as st
+import metrics
 from geolocation import handle_geolocation
-from db import get_latest_record, get_access_logs
+from db import get_latest_record
+from st_adapter import bootstrap
 
 # Secciones modulares
 from sections.inspector import show_latest_record
 from sections.controls import handle_url_input
-from sections.history import show_access_logs
+from sections.history import show_history_section
 from sections.display import show_image, manual_verification
+from sections.debug import show_metrics_panel
 
 # ==============================
 # Configuración de la app
 # ==============================
 st.set_page_config(page_title="📸 Update", layout="centered")
 
+# Registrar tiempos de esta ejecución (si PHOTO_METRICS=1)
+metrics.start_run()
+
+# Configurar la capa de datos con st.secrets y asegurar índices (una vez por proceso)
+bootstrap()
+
 # Inicializar session_state
 if "geo_data" not in st.session_state or st.session_state.geo_data is None:
     st.session_state.geo_data = None
@@ -43,13 +52,14 @@ if latest:
 # ==============================
 # Manejar input de URL (primer registro o actualización)
 # ==============================
-nuevo_guardado = handle_url_input(latest, st.session_state.geo_data)
+handle_url_input(latest, st.session_state.geo_data)
 
 # ==============================
 # Mostrar imagen actual
 # ==============================
 url_mongo = latest.get("photo_url") if latest else None
-show_image(url_mongo, nuevo_guardado)
+hash_mongo = latest.get("hash") if latest else None
+show_image(url_mongo, hash_mongo)
 
 # ==============================
 # Verificación manual
@@ -59,5 +69,10 @@ manual_verification()
 # ==============================
 # Mostrar historial de accesos
 # ==============================
-logs = get_access_logs()
-show_access_logs(logs)
+show_history_section()
+
+# ==============================
+# Panel de tiempos y exportación de métricas
+# ==============================
+show_metrics_panel()
+metrics.export_to_file()
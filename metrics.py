@@ -0,0 +1,189 @@
+# metrics.py
+# ============================================
+# Instrumentación liviana: tiempos, bytes y errores de las rutas calientes.
+#
+# - @timed("nombre") / with track("nombre"): mide duración y errores.
+# - add_bytes("nombre", n): acumula bytes transferidos.
+# - export_prometheus() / export_json() / export_to_file(): exportación.
+# - start_run() / run_events(): tiempos de la ejecución actual (panel debug).
+#
+# Desactivado por defecto (PHOTO_METRICS=1 para activar): cuando está
+# apagado, @timed solo agrega una comprobación de un booleano por llamada.
+# ============================================
+
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_enabled = os.environ.get("PHOTO_METRICS", "0").lower() in ("1", "true", "yes")
+METRICS_FILE = os.environ.get("PHOTO_METRICS_FILE", "")
+
+_lock = threading.Lock()
+_stats = {}                 # nombre → {"count", "errors", "total_s", "max_s", "bytes"}
+_local = threading.local()  # eventos de la ejecución actual (por hilo / rerun)
+
+# ==============================
+# Activación
+# ==============================
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(value: bool = True):
+    """Activa o desactiva la instrumentación en tiempo de ejecución."""
+    global _enabled
+    _enabled = value
+
+# ==============================
+# Registro
+# ==============================
+def _entry(name: str) -> dict:
+    entry = _stats.get(name)
+    if entry is None:
+        entry = _stats[name] = {"count": 0, "errors": 0, "total_s": 0.0,
+                                "max_s": 0.0, "bytes": 0}
+    return entry
+
+
+def record(name: str, duration_s: float, error: bool = False):
+    """Registra una medición de `name`."""
+    with _lock:
+        entry = _entry(name)
+        entry["count"] += 1
+        entry["total_s"] += duration_s
+        entry["max_s"] = max(entry["max_s"], duration_s)
+        if error:
+            entry["errors"] += 1
+    events = getattr(_local, "events", None)
+    if events is not None:
+        events.append((name, duration_s, error))
+
+
+def add_bytes(name: str, nbytes: int):
+    """Acumula bytes transferidos para `name` (no hace nada si está apagado)."""
+    if not _enabled or not nbytes:
+        return
+    with _lock:
+        _entry(name)["bytes"] += nbytes
+
+
+@contextmanager
+def track(name: str):
+    """Context manager que mide la duración (y errores) del bloque."""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record(name, time.perf_counter() - start, error)
+
+
+def timed(name: str):
+    """
+    Decorador que mide cada llamada a la función con el nombre `name`.
+    En funciones async mide hasta que la corrutina termina.
+    """
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await fn(*args, **kwargs)
+                start = time.perf_counter()
+                error = False
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception:
+                    error = True
+                    raise
+                finally:
+                    record(name, time.perf_counter() - start, error)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            error = False
+            try:
+                return fn(*args, **kwargs)
+            except Exception:  # st.rerun()/st.stop() no cuentan como error
+                error = True
+                raise
+            finally:
+                record(name, time.perf_counter() - start, error)
+        return wrapper
+    return decorator
+
+# ==============================
+# Ejecución actual (rerun)
+# ==============================
+def start_run():
+    """Comienza a registrar los eventos de la ejecución actual de este hilo."""
+    _local.events = [] if _enabled else None
+
+
+def run_events() -> list:
+    """Eventos (nombre, duración_s, error) de la ejecución actual."""
+    return list(getattr(_local, "events", None) or [])
+
+# ==============================
+# Exportación
+# ==============================
+def snapshot() -> dict:
+    """Copia de las métricas acumuladas."""
+    with _lock:
+        return {name: dict(entry) for name, entry in _stats.items()}
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+
+
+def export_json() -> str:
+    return json.dumps(snapshot(), indent=2, sort_keys=True)
+
+
+def export_prometheus() -> str:
+    """Métricas en formato de texto de Prometheus."""
+    families = (
+        ("photo_update_calls_total", "counter", lambda e: e["count"]),
+        ("photo_update_errors_total", "counter", lambda e: e["errors"]),
+        ("photo_update_duration_seconds_total", "counter", lambda e: f"{e['total_s']:.6f}"),
+        ("photo_update_duration_seconds_max", "gauge", lambda e: f"{e['max_s']:.6f}"),
+        ("photo_update_bytes_total", "counter", lambda e: e["bytes"]),
+    )
+    stats = sorted(snapshot().items())
+    lines = []
+    for metric, kind, value in families:
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, e in stats:
+            lines.append(f'{metric}{{op="{name}"}} {value(e)}')
+    return "\n".join(lines) + "\n"
+
+
+def export_to_file(path: str = None):
+    """
+    Escribe las métricas en `path` (o PHOTO_METRICS_FILE): formato Prometheus
+    salvo que la extensión sea .json. Escritura atómica.
+    """
+    path = path or METRICS_FILE
+    if not _enabled or not path:
+        return
+    content = export_json() if path.endswith(".json") else export_prometheus()
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp, path)
@@ -1,21 +1,256 @@
 # notifier.py
-import streamlit as st
-from twilio.rest import Client
+# ============================================
+# Notificaciones (WhatsApp vía Twilio) con cola de envío en segundo plano,
+# agrupación de errores repetidos y límite de envíos por destino.
+# ============================================
 
+import atexit
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+import config
+from metrics import timed, track
+
+# Ventana (s) en la que los mensajes idénticos se agrupan en uno solo
+COALESCE_WINDOW = float(os.environ.get("NOTIFY_COALESCE_WINDOW", 600))
+# Máximo de envíos por destino dentro de RATE_PERIOD segundos
+RATE_LIMIT = int(os.environ.get("NOTIFY_RATE_LIMIT", 5))
+RATE_PERIOD = float(os.environ.get("NOTIFY_RATE_PERIOD", 3600))
+MAX_QUEUE = 1000
+# Segundos que se espera al salir del proceso para enviar lo encolado
+DRAIN_TIMEOUT = float(os.environ.get("NOTIFY_DRAIN_TIMEOUT", 10))
+
+# ==============================
+# Transportes
+# ==============================
+def _twilio_secrets():
+    """Sección [twilio] de la configuración (config.py / TWILIO_*)."""
+    return config.section("twilio")
+
+
+class TwilioTransport:
+    """
+    Envía por WhatsApp con Twilio. El cliente se crea una sola vez y se reutiliza;
+    el SDK de Twilio se importa al primer envío, no al cargar el módulo.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def default_to(self):
+        return _twilio_secrets()["to_number"]
+
+    def _get_client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from twilio.rest import Client
+                    secrets = _twilio_secrets()
+                    self._client = Client(secrets["account_sid"], secrets["auth_token"])
+        return self._client
+
+    def send(self, message: str, to: str):
+        msg = self._get_client().messages.create(
+            body=message,
+            from_=f"whatsapp:{_twilio_secrets()['sandbox_number']}",
+            to=f"whatsapp:{to}"
+        )
+        return msg.sid
+
+
+class ConsoleTransport:
+    """Imprime las notificaciones en stdout (pruebas / desarrollo)."""
+
+    default_to = "console"
+
+    def send(self, message: str, to: str):
+        print(f"📣 [{to}] {message}", file=sys.stdout, flush=True)
+        return None
+
+
+class FileTransport:
+    """Agrega las notificaciones a un archivo de texto (pruebas / desarrollo)."""
+
+    default_to = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def send(self, message: str, to: str):
+        line = f"{time.strftime('%Y-%m-%d %H:%M:%S')} [{to}] {message}\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+        return None
+
+
+def transport_from_env():
+    """
+    Elige el transporte según NOTIFY_TRANSPORT:
+      - "twilio" (default), "console" o "file:<ruta>"
+    """
+    name = os.environ.get("NOTIFY_TRANSPORT", "twilio")
+    if name == "console":
+        return ConsoleTransport()
+    if name.startswith("file:"):
+        return FileTransport(name[len("file:"):])
+    return TwilioTransport()
+
+# ==============================
+# Despachador en segundo plano
+# ==============================
+class NotificationDispatcher:
+    """
+    Cola de notificaciones con un hilo de envío:
+    - notify() solo encola (no espera a Twilio).
+    - Mensajes idénticos dentro de COALESCE_WINDOW se agrupan: se envía el
+      primero y al cerrar la ventana un resumen con la cantidad de repeticiones.
+    - Máximo RATE_LIMIT envíos por destino cada RATE_PERIOD segundos; lo que
+      exceda se cuenta y se informa en el siguiente envío permitido.
+    """
+
+    def __init__(self, transport, *, window=COALESCE_WINDOW, rate_limit=RATE_LIMIT,
+                 rate_period=RATE_PERIOD, max_queue=MAX_QUEUE):
+        self.transport = transport
+        self.window = window
+        self.rate_limit = rate_limit
+        self.rate_period = rate_period
+        self._queue = queue.Queue(maxsize=max_queue)
+        # Estado usado solo por el hilo de envío
+        self._recent = {}        # (to, message) → {"first": t, "count": n}
+        self._sent = {}          # to → deque de timestamps de envío
+        self._suppressed = {}    # to → mensajes descartados por límite
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="notifier", daemon=True)
+        self._thread.start()
+
+    def notify(self, message: str, to=None) -> bool:
+        """Encola una notificación. Retorna False si la cola está llena."""
+        try:
+            self._queue.put_nowait((to or self.transport.default_to, message))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    # ------------------------------
+    # Hilo de envío
+    # ------------------------------
+    def _run(self):
+        while True:
+            try:
+                to, message = self._queue.get(timeout=1.0)
+            except queue.Empty:
+                pass
+            else:
+                try:
+                    self._handle(to, message, time.monotonic())
+                finally:
+                    self._queue.task_done()  # envío terminado (para wait_idle)
+            self._close_windows(time.monotonic())
+
+    def _handle(self, to, message, now):
+        key = (to, message)
+        entry = self._recent.get(key)
+        if entry and now - entry["first"] < self.window:
+            entry["count"] += 1  # repetido dentro de la ventana → agrupar
+            return
+        self._recent[key] = {"first": now, "count": 0}
+        self._deliver(to, message, now)
+
+    def _close_windows(self, now):
+        for key, entry in list(self._recent.items()):
+            if now - entry["first"] >= self.window:
+                del self._recent[key]
+                if entry["count"]:
+                    to, message = key
+                    self._deliver(to, f"{message} (repetido {entry['count']} veces)", now)
+
+    def _deliver(self, to, message, now):
+        sent = self._sent.setdefault(to, deque())
+        while sent and now - sent[0] >= self.rate_period:
+            sent.popleft()
+        if len(sent) >= self.rate_limit:
+            self._suppressed[to] = self._suppressed.get(to, 0) + 1
+            return
+
+        suppressed = self._suppressed.pop(to, 0)
+        if suppressed:
+            message = f"{message} (+{suppressed} alertas suprimidas)"
+        sent.append(now)
+        try:
+            with track("notifier.deliver"):
+                self.transport.send(message, to)
+        except Exception as e:
+            print(f"⚠️ No se pudo enviar notificación: {e}", flush=True)
+
+    def wait_idle(self, timeout=5.0) -> bool:
+        """
+        Espera a que se procese todo lo encolado, incluido el envío en curso
+        (útil en pruebas y al cerrar). Retorna False si venció el timeout.
+        """
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> NotificationDispatcher:
+    """Devuelve el despachador del proceso (se crea al primer uso)."""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = NotificationDispatcher(transport_from_env())
+    return _dispatcher
+
+
+def _drain_at_exit():
+    """El hilo es daemon: al salir (p. ej. worker --once) enviar lo pendiente."""
+    if _dispatcher is not None:
+        _dispatcher.wait_idle(DRAIN_TIMEOUT)
+
+
+def _reset_after_fork():
+    """El hijo de un fork no hereda el hilo de envío: crea su propio despachador."""
+    global _dispatcher, _dispatcher_lock
+    _dispatcher = None
+    _dispatcher_lock = threading.Lock()
+
+
+atexit.register(_drain_at_exit)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+# ==============================
+# API pública
+# ==============================
+_twilio = TwilioTransport()
+
+
+@timed("notifier.send_whatsapp")
 def send_whatsapp(message: str):
-    client = Client(
-        st.secrets["twilio"]["account_sid"],
-        st.secrets["twilio"]["auth_token"]
-    )
-    msg = client.messages.create(
-        body=message,
-        from_=f"whatsapp:{st.secrets['twilio']['sandbox_number']}",
-        to=f"whatsapp:{st.secrets['twilio']['to_number']}"
-    )
-    return msg.sid
+    """Envío directo y síncrono por WhatsApp (cliente Twilio reutilizado)."""
+    return _twilio.send(message, _twilio.default_to)
+
 
+@timed("notifier.notify_if_image_error")
 def notify_if_image_error(error_message: str):
+    """Encola la alerta de error de imagen (no bloquea la verificación)."""
     try:
-        send_whatsapp(f"Error con la foto: {error_message}")
+        get_dispatcher().notify(f"Error con la foto: {error_message}")
     except Exception as e:
-        st.error(f"No se pudo enviar notificación: {e}")
+        print(f"⚠️ No se pudo enviar notificación: {e}", flush=True)
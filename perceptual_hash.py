@@ -0,0 +1,124 @@
+# perceptual_hash.py
+# ============================================
+# Hash perceptual (aHash / dHash / pHash) con NumPy
+# Para ignorar recompresiones del CDN, cambios de EXIF o redimensionados.
+# ============================================
+
+import io
+import os
+import numpy as np
+from PIL import Image
+
+# Modo: "off" (solo SHA-256), "ahash", "dhash" o "phash"
+PHASH_MODE = os.environ.get("PHASH_MODE", "off").lower()
+# Distancia de Hamming máxima para considerar "la misma foto"
+PHASH_THRESHOLD = int(os.environ.get("PHASH_THRESHOLD", 8))
+
+HASH_SIZE = 8  # 8x8 → hash de 64 bits
+
+# ==============================
+# Preparación de imágenes
+# ==============================
+def to_gray_array(content: bytes, size) -> np.ndarray:
+    """
+    Decodifica bytes de imagen → matriz float32 en escala de grises de tamaño (alto, ancho).
+    """
+    with Image.open(io.BytesIO(content)) as img:
+        img = img.convert("L").resize((size[1], size[0]), Image.LANCZOS)
+        return np.asarray(img, dtype=np.float32)
+
+
+def _input_size(method: str):
+    if method == "dhash":
+        return (HASH_SIZE, HASH_SIZE + 1)
+    if method == "phash":
+        return (HASH_SIZE * 4, HASH_SIZE * 4)
+    return (HASH_SIZE, HASH_SIZE)
+
+# ==============================
+# Hashes en lote (N imágenes a la vez)
+# ==============================
+def _dct_matrix(n: int) -> np.ndarray:
+    """Matriz DCT-II ortonormal de n x n."""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    m = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    m[0, :] = np.sqrt(1.0 / n)
+    return m
+
+
+def bits_from_arrays(arrays: np.ndarray, method: str) -> np.ndarray:
+    """
+    Calcula los bits del hash para un lote de matrices (N, alto, ancho).
+    Retorna una matriz booleana (N, HASH_SIZE * HASH_SIZE).
+    """
+    n = arrays.shape[0]
+    if method == "ahash":
+        flat = arrays.reshape(n, -1)
+        return flat > flat.mean(axis=1, keepdims=True)
+    if method == "dhash":
+        return (arrays[:, :, 1:] > arrays[:, :, :-1]).reshape(n, -1)
+    if method == "phash":
+        d = _dct_matrix(arrays.shape[1])
+        coeffs = d @ arrays @ d.T                     # DCT 2D de todo el lote
+        low = coeffs[:, :HASH_SIZE, :HASH_SIZE].reshape(n, -1)
+        med = np.median(low[:, 1:], axis=1, keepdims=True)  # sin el término DC
+        return low > med
+    raise ValueError(f"Método de hash perceptual desconocido: {method}")
+
+
+def pack_bits(bits: np.ndarray) -> list:
+    """Convierte una matriz de bits (N, 64) → lista de strings hex de 16 caracteres."""
+    packed = np.packbits(bits.astype(np.uint8), axis=1)
+    return [row.tobytes().hex() for row in packed]
+
+
+def batch_hashes(contents, method: str = None) -> list:
+    """
+    Calcula el hash perceptual de varias imágenes (lista de bytes) en un solo lote.
+    Las imágenes que no se pueden decodificar retornan None.
+    """
+    method = method or PHASH_MODE
+    size = _input_size(method)
+    arrays, positions = [], []
+    for pos, content in enumerate(contents):
+        try:
+            arrays.append(to_gray_array(content, size))
+            positions.append(pos)
+        except Exception:
+            continue
+
+    result = [None] * len(contents)
+    if arrays:
+        hashes = pack_bits(bits_from_arrays(np.stack(arrays), method))
+        for pos, h in zip(positions, hashes):
+            result[pos] = h
+    return result
+
+
+def perceptual_hash(content: bytes, method: str = None):
+    """Hash perceptual (hex) de una sola imagen, o None si no se puede decodificar."""
+    return batch_hashes([content], method)[0]
+
+# ==============================
+# Comparación
+# ==============================
+def hamming_distance(hash_a: str, hash_b: str) -> int:
+    """Cantidad de bits distintos entre dos hashes hex."""
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count("1")
+
+
+def is_same_image(hash_a, hash_b, threshold: int = None) -> bool:
+    """
+    True si ambos hashes perceptuales están dentro del umbral de Hamming.
+    Si falta alguno, no se puede afirmar que sean la misma imagen.
+    """
+    if not hash_a or not hash_b:
+        return False
+    threshold = PHASH_THRESHOLD if threshold is None else threshold
+    return hamming_distance(hash_a, hash_b) <= threshold
+
+
+def enabled() -> bool:
+    """True si el modo perceptual está activo."""
+    return PHASH_MODE in ("ahash", "dhash", "phash")
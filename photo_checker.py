@@ -3,32 +3,172 @@
 # Descarga, verificación y actualización de fotos
 # ============================================
 
-import requests
+import os
 import hashlib
+from http_client import http_get
+from image_cache import get_cached, put_cached, CacheWriter
+from thumbnails import ensure_renditions, get_rendition
+import metrics
+from metrics import timed
 from notifier import notify_if_image_error
-from db import get_latest_record, insert_photo_record
+from db import get_latest_record, insert_photo_record, mark_photo_seen
 from datetime import datetime
 import pytz
 
 # Zona horaria local (Bogotá)
 colombia = pytz.timezone("America/Bogota")
 
+# Tamaño máximo aceptado por descarga (bytes) y tamaño de cada bloque leído
+MAX_IMAGE_BYTES = int(os.environ.get("PHOTO_MAX_BYTES", 20 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
 # ==============================
 # Descarga de imagen
 # ==============================
+@timed("photo_checker.download_image")
 def download_image(url: str) -> bytes:
     """
     Descarga la imagen desde una URL y devuelve su contenido en bytes.
+    Respeta el límite MAX_IMAGE_BYTES (lectura por bloques).
     Si falla, notifica el error y retorna None.
     """
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        return resp.content
+        with http_get(url, stream=True) as resp:
+            resp.raise_for_status()
+            buf = bytearray()
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                buf.extend(chunk)
+                if len(buf) > MAX_IMAGE_BYTES:
+                    raise ValueError(f"imagen demasiado grande (> {MAX_IMAGE_BYTES} bytes)")
+            metrics.add_bytes("photo_checker.download_image", len(buf))
+            return bytes(buf)
     except Exception as e:
         notify_if_image_error(f"Error descargando imagen: {e}")
         return None
 
+@timed("photo_checker.load_image")
+def load_image(url: str, hash_value=None):
+    """
+    Devuelve los bytes de la imagen usando primero la caché local
+    (direccionada por el hash guardado en el historial).
+    Si no está en caché → descarga, guarda en caché y retorna.
+    """
+    if hash_value:
+        cached = get_cached(hash_value)
+        if cached is not None:
+            return cached
+
+    content = download_image(url)
+    if content:
+        try:
+            put_cached(content)
+        except OSError:
+            pass  # caché no disponible (disco lleno / sin permisos)
+    return content
+
+@timed("photo_checker.load_thumbnail")
+def load_thumbnail(url: str, hash_value=None, width: int = 1024):
+    """
+    Devuelve la miniatura (rendition) de la imagen para mostrar en la UI.
+    Si no existe todavía, la genera a partir del original (caché o descarga).
+    Si no se puede generar, retorna el original.
+    """
+    if hash_value:
+        thumb = get_rendition(hash_value, width)
+        if thumb is not None:
+            return thumb
+
+    content = load_image(url, hash_value)
+    if not content:
+        return content
+    try:
+        content_hash = calculate_hash(content)
+        ensure_renditions(content_hash, content)
+        return get_rendition(content_hash, width) or content
+    except Exception:
+        return content  # formato no soportado o caché no disponible
+
+@timed("photo_checker.stream_hash")
+def stream_hash(url: str, validators=None, *, max_bytes: int = MAX_IMAGE_BYTES,
+                cache: bool = True):
+    """
+    Descarga en streaming (condicional) y calcula el SHA-256 bloque a bloque,
+    sin guardar la imagen completa en memoria.
+
+    Retorna una tupla (status, digest, byte_count, validators):
+      - status 304 → digest None, byte_count 0.
+      - status 200 → digest hex y cantidad de bytes leídos.
+    Si cache=True, los bloques se copian también a la caché local de imágenes
+    (sin retenerlos en memoria).
+    Lanza ValueError si el cuerpo supera `max_bytes`.
+    """
+    headers = conditional_headers(validators)
+    writer = None
+    with http_get(url, headers=headers, stream=True) as resp:
+        if resp.status_code == 304:
+            return 304, None, 0, validators
+        resp.raise_for_status()
+
+        # Rechazar antes de leer si el servidor ya declara un tamaño excesivo
+        declared = resp.headers.get("Content-Length")
+        if declared and declared.isdigit() and int(declared) > max_bytes:
+            raise ValueError(f"imagen demasiado grande ({declared} bytes > {max_bytes})")
+
+        sha = hashlib.sha256()
+        total = 0
+        if cache:
+            try:
+                writer = CacheWriter()
+            except OSError:
+                writer = None  # caché no disponible → solo hash
+        try:
+            for chunk in resp.iter_content(chunk_size=CHUNK_SIZE):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise ValueError(f"imagen demasiado grande (> {max_bytes} bytes)")
+                sha.update(chunk)
+                if writer:
+                    writer.write(chunk)
+        except Exception:
+            if writer:
+                writer.abort()
+            raise
+
+        digest = sha.hexdigest()
+        metrics.add_bytes("photo_checker.stream_hash", total)
+        if writer:
+            if total:
+                writer.commit(digest)
+            else:
+                writer.abort()
+        return resp.status_code, digest, total, extract_validators(resp.headers)
+
+
+def conditional_headers(validators=None) -> dict:
+    """
+    Construye los headers If-None-Match / If-Modified-Since
+    a partir de los validadores guardados.
+    """
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+
+def extract_validators(headers) -> dict:
+    """
+    Extrae los validadores HTTP (ETag, Last-Modified, Content-Length)
+    de los headers de una respuesta.
+    """
+    return {
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "content_length": headers.get("Content-Length"),
+    }
+
 # ==============================
 # Hash de la imagen
 # ==============================
@@ -38,16 +178,100 @@ def calculate_hash(content: bytes) -> str:
     """
     return hashlib.sha256(content).hexdigest()
 
+# ==============================
+# Detección de cambios
+# ==============================
+@timed("photo_checker.detect_change")
+def detect_change(photo_url: str, last_hash=None, validators=None, last_phash=None) -> dict:
+    """
+    Descarga (de forma condicional y en streaming) una foto y la compara
+    con el hash conocido. No escribe en la DB: solo reporta el resultado.
+
+    Si el modo perceptual está activo (PHASH_MODE) y el SHA-256 cambió,
+    se compara también el hash perceptual con `last_phash`: si la distancia
+    de Hamming está dentro del umbral, se considera una recompresión
+    (status "unchanged", reencoded=True) y no un cambio real.
+
+    Retorna un dict con:
+      - status     : "changed", "unchanged" o "error"
+      - hash       : hash nuevo (None si 304 o error)
+      - validators : validadores HTTP vigentes
+      - bytes      : bytes descargados (0 si 304 o error)
+      - phash      : hash perceptual nuevo (None si el modo está apagado)
+      - reencoded  : True si cambió el SHA-256 pero no la imagen percibida
+      - error      : mensaje de error (solo si status == "error")
+    """
+    try:
+        status, new_hash, nbytes, new_validators = stream_hash(photo_url, validators)
+    except Exception as e:
+        return {"status": "error", "hash": None, "bytes": 0,
+                "validators": validators, "error": str(e)}
+    return classify_download(status, new_hash, nbytes, new_validators,
+                             last_hash=last_hash, validators=validators,
+                             last_phash=last_phash)
+
+
+def classify_download(status, new_hash, nbytes, new_validators, *, last_hash=None,
+                      validators=None, last_phash=None) -> dict:
+    """
+    Arma el resultado de detect_change() a partir de lo descargado por
+    stream_hash(): compara hashes (y hash perceptual) y genera las miniaturas
+    si hubo un cambio real. Compartido con la variante async.
+    """
+    # 304 Not Modified → sin cambios, sin bytes ni hash
+    if status == 304:
+        return {"status": "unchanged", "hash": None, "bytes": 0,
+                "validators": validators}
+    if not nbytes:
+        return {"status": "error", "hash": None, "bytes": 0,
+                "validators": validators, "error": "respuesta vacía"}
+
+    changed = new_hash != last_hash
+    new_phash = None
+    reencoded = False
+    if changed:
+        import perceptual_hash  # NumPy/Pillow solo cuando llega un hash nuevo
+        content = get_cached(new_hash) if perceptual_hash.enabled() else None
+        if content is not None:
+            new_phash = perceptual_hash.perceptual_hash(content)
+            reencoded = perceptual_hash.is_same_image(last_phash, new_phash)
+            changed = not reencoded
+
+    if changed:
+        # Generar miniaturas una sola vez por hash nuevo (desde la caché)
+        try:
+            ensure_renditions(new_hash)
+        except Exception:
+            pass
+
+    return {
+        "status": "changed" if changed else "unchanged",
+        "hash": new_hash,
+        "bytes": nbytes,
+        "validators": new_validators,
+        "phash": new_phash,
+        "reencoded": reencoded,
+    }
+
 # ==============================
 # Verificación y actualización
 # ==============================
-def check_and_update_photo():
+# Estados de check_photo()
+CHECK_CHANGED = "changed"
+CHECK_UNCHANGED = "unchanged"
+CHECK_NO_RECORD = "no_record"
+CHECK_ERROR = "error"
+
+
+@timed("photo_checker.check_photo")
+def check_photo():
     """
     Verifica si la foto más reciente ha cambiado (comparando hash).
     
     Flujo:
       1. Obtiene el último registro desde la DB.
-      2. Descarga la foto actual.
+      2. Descarga la foto actual de forma condicional (ETag / Last-Modified).
+         Si el servidor responde 304 → no hubo cambios (sin descargar bytes).
       3. Calcula el hash y lo compara con el guardado.
       4. Si hay cambios → inserta un nuevo registro en la DB
          usando insert_photo_record() con:
@@ -55,37 +279,61 @@ def check_and_update_photo():
             - nuevo hash
             - fecha actual (Bogotá → convertida a UTC)
             - sin geo_data (None)
+            - validadores HTTP de la respuesta
+         Si no hay cambios → no inserta: marca el registro como visto
+         (last_seen_at / seen_count) y refresca los validadores.
     Retorna:
-      (status: bool, mensaje: str)
+      (estado: str, mensaje: str) — estado es CHECK_CHANGED, CHECK_UNCHANGED,
+      CHECK_NO_RECORD o CHECK_ERROR (el mensaje es solo para mostrar).
     """
     latest = get_latest_record()
     if not latest:
-        return False, "No hay foto inicial en DB."
+        return CHECK_NO_RECORD, "No hay foto inicial en DB."
 
     try:
-        img = download_image(latest["photo_url"])
-        if not img:
-            return False, "No se pudo descargar la imagen."
+        result = detect_change(
+            latest["photo_url"], latest.get("hash"), latest.get("validators"),
+            last_phash=latest.get("phash")
+        )
 
-        # Calcular nuevo hash
-        new_hash = calculate_hash(img)
+        if result["status"] == "error":
+            notify_if_image_error(f"Error descargando imagen: {result['error']}")
+            return CHECK_ERROR, "No se pudo descargar la imagen."
 
         # Comparar con el último guardado
-        if new_hash != latest.get("hash"):
+        if result["status"] == "changed":
             # Convertir fecha local a UTC
             now_bogota = datetime.now(colombia)
             now_utc = now_bogota.astimezone(pytz.UTC)
 
             # Insertar nuevo registro en Mongo
             insert_photo_record(
-                latest["photo_url"],   # URL foto
-                new_hash,              # hash nuevo
-                checked_at=now_utc,    # fecha de verificación
-                geo_data=None          # opcional (no aplica aquí)
+                latest["photo_url"],              # URL foto
+                result["hash"],                   # hash nuevo
+                checked_at=now_utc,               # fecha de verificación
+                geo_data=None,                    # opcional (no aplica aquí)
+                validators=result["validators"],  # ETag / Last-Modified
+                phash=result["phash"]             # hash perceptual (opcional)
             )
 
-            return True, "✅ Nueva foto detectada y guardada."
+            return CHECK_CHANGED, "✅ Nueva foto detectada y guardada."
 
-        return False, "ℹ️ No hubo cambios."
+        # Mismo contenido → contador de vistas + validadores para el próximo check condicional
+        validators = result["validators"]
+        mark_photo_seen(
+            latest["_id"],
+            validators=validators if validators != latest.get("validators") else None
+        )
+
+        return CHECK_UNCHANGED, "ℹ️ No hubo cambios."
     except Exception as e:
-        return False, f"Error verificando foto: {e}"
\ No newline at end of file
+        return CHECK_ERROR, f"Error verificando foto: {e}"
+
+
+def check_and_update_photo():
+    """
+    Igual que check_photo() pero retorna (hubo_cambio: bool, mensaje: str)
+    (lo que usa la UI).
+    """
+    status, msg = check_photo()
+    return status == CHECK_CHANGED, msg
@@ -0,0 +1,227 @@
+# photo_checker_async.py
+# ============================================
+# Variante asyncio de photo_checker (aiohttp + db_async).
+# Permite verificar miles de URLs en un solo event loop en vez de un
+# pool grande de hilos. Las reglas (validadores, límite de tamaño, caché,
+# hash perceptual y miniaturas) son las mismas de photo_checker.
+# ============================================
+
+import asyncio
+import hashlib
+import os
+import weakref
+from datetime import datetime
+import aiohttp
+import pytz
+
+import db_async
+import metrics
+from metrics import timed
+from http_client import (CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES, BACKOFF_FACTOR,
+                         POOL_PER_HOST, USER_AGENT)
+from image_cache import CacheWriter
+from notifier import notify_if_image_error
+from photo_checker import (MAX_IMAGE_BYTES, CHUNK_SIZE, colombia, conditional_headers,
+                           extract_validators, classify_download, CHECK_CHANGED,
+                           CHECK_UNCHANGED, CHECK_NO_RECORD, CHECK_ERROR)
+
+# Verificaciones simultáneas (y conexiones abiertas en total)
+CONCURRENCY = int(os.environ.get("PHOTO_ASYNC_CONCURRENCY", 200))
+RETRY_STATUSES = (500, 502, 503, 504)
+# Bytes que se acumulan antes de escribirlos en la caché (en un hilo)
+CACHE_WRITE_BYTES = 256 * 1024
+
+# ==============================
+# Sesión HTTP (una por event loop)
+# ==============================
+_sessions = weakref.WeakKeyDictionary()   # event loop → aiohttp.ClientSession
+
+
+def get_session() -> aiohttp.ClientSession:
+    """
+    Sesión aiohttp del event loop actual: pool de CONCURRENCY conexiones
+    (POOL_PER_HOST por host) y los mismos timeouts que http_client.
+    """
+    loop = asyncio.get_running_loop()
+    session = _sessions.get(loop)
+    if session is None or session.closed:
+        session = _sessions[loop] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=CONCURRENCY, limit_per_host=POOL_PER_HOST),
+            timeout=aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT),
+            headers={"User-Agent": USER_AGENT},
+        )
+    return session
+
+
+async def close_session():
+    """Cierra la sesión del event loop actual (al terminar el loop)."""
+    session = _sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
+
+
+async def http_get(url: str, headers=None) -> aiohttp.ClientResponse:
+    """
+    GET con reintentos y backoff exponencial (como http_client) para fallos
+    de conexión, timeouts y respuestas 5xx. El cuerpo queda sin leer:
+    usar la respuesta con `async with`.
+    """
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            resp = await session.get(url, headers=headers)
+            if resp.status not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return resp
+            resp.release()
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+            if attempt == MAX_RETRIES:
+                raise
+        await asyncio.sleep(BACKOFF_FACTOR * (2 ** attempt))
+
+# ==============================
+# Descarga condicional + hash
+# ==============================
+@timed("photo_checker_async.stream_hash")
+async def stream_hash(url: str, validators=None, *, max_bytes: int = MAX_IMAGE_BYTES,
+                      cache: bool = True):
+    """
+    Igual que photo_checker.stream_hash(): descarga condicional en streaming,
+    SHA-256 bloque a bloque y copia opcional a la caché local.
+    Las escrituras en disco (por bloques de CACHE_WRITE_BYTES), el commit y su
+    expulsión LRU corren en un hilo para no bloquear el event loop.
+    Retorna (status, digest, byte_count, validators).
+    """
+    writer = None
+    async with await http_get(url, headers=conditional_headers(validators)) as resp:
+        if resp.status == 304:
+            return 304, None, 0, validators
+        resp.raise_for_status()
+
+        # Rechazar antes de leer si el servidor ya declara un tamaño excesivo
+        if resp.content_length is not None and resp.content_length > max_bytes:
+            raise ValueError(f"imagen demasiado grande ({resp.content_length} bytes > {max_bytes})")
+
+        sha = hashlib.sha256()
+        total = 0
+        if cache:
+            try:
+                writer = await asyncio.to_thread(CacheWriter)
+            except OSError:
+                writer = None  # caché no disponible → solo hash
+        pending = bytearray()
+        try:
+            async for chunk in resp.content.iter_chunked(CHUNK_SIZE):
+                total += len(chunk)
+                if total > max_bytes:
+                    raise ValueError(f"imagen demasiado grande (> {max_bytes} bytes)")
+                sha.update(chunk)
+                if writer:
+                    pending.extend(chunk)
+                    if len(pending) >= CACHE_WRITE_BYTES:
+                        await asyncio.to_thread(writer.write, bytes(pending))
+                        pending.clear()
+            if writer and pending:
+                await asyncio.to_thread(writer.write, bytes(pending))
+        except BaseException:
+            if writer:
+                writer.abort()  # solo cierra y borra el temporal
+            raise
+
+        digest = sha.hexdigest()
+        metrics.add_bytes("photo_checker_async.stream_hash", total)
+        if writer:
+            if total:
+                await asyncio.to_thread(writer.commit, digest)
+            else:
+                await asyncio.to_thread(writer.abort)
+        return resp.status, digest, total, extract_validators(resp.headers)
+
+# ==============================
+# Detección de cambios
+# ==============================
+@timed("photo_checker_async.detect_change")
+async def detect_change(photo_url: str, last_hash=None, validators=None, last_phash=None) -> dict:
+    """
+    Igual que photo_checker.detect_change() (mismo dict de resultado).
+    El hash perceptual y las miniaturas (CPU / disco) corren en un hilo
+    para no bloquear el loop.
+    """
+    try:
+        status, new_hash, nbytes, new_validators = await stream_hash(photo_url, validators)
+    except Exception as e:
+        return {"status": "error", "hash": None, "bytes": 0,
+                "validators": validators, "error": str(e) or type(e).__name__}
+
+    args = (status, new_hash, nbytes, new_validators)
+    kwargs = {"last_hash": last_hash, "validators": validators, "last_phash": last_phash}
+    if status == 304 or new_hash == last_hash:
+        return classify_download(*args, **kwargs)  # sin trabajo pesado
+    return await asyncio.to_thread(classify_download, *args, **kwargs)
+
+
+async def detect_changes(items, concurrency: int = CONCURRENCY) -> list:
+    """
+    Verifica muchas fotos a la vez. `items` son dicts con photo_url y,
+    opcionalmente, hash / validators / phash (p. ej. documentos de `watches`).
+    Retorna los resultados en el mismo orden, con `photo_url` incluido.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(item):
+        async with semaphore:
+            result = await detect_change(item["photo_url"], item.get("hash"),
+                                         item.get("validators"), item.get("phash"))
+        result["photo_url"] = item["photo_url"]
+        return result
+
+    return await asyncio.gather(*(check(item) for item in items))
+
+# ==============================
+# Verificación y actualización
+# ==============================
+@timed("photo_checker_async.check_photo")
+async def check_photo():
+    """
+    Igual que photo_checker.check_photo() sobre db_async.
+    Retorna (estado: str, mensaje: str) con los mismos CHECK_*.
+    """
+    latest = await db_async.get_latest_record()
+    if not latest:
+        return CHECK_NO_RECORD, "No hay foto inicial en DB."
+
+    try:
+        result = await detect_change(
+            latest["photo_url"], latest.get("hash"), latest.get("validators"),
+            last_phash=latest.get("phash")
+        )
+
+        if result["status"] == "error":
+            notify_if_image_error(f"Error descargando imagen: {result['error']}")
+            return CHECK_ERROR, "No se pudo descargar la imagen."
+
+        if result["status"] == "changed":
+            await db_async.insert_photo_record(
+                latest["photo_url"],
+                result["hash"],
+                checked_at=datetime.now(colombia).astimezone(pytz.UTC),
+                validators=result["validators"],
+                phash=result["phash"]
+            )
+            return CHECK_CHANGED, "✅ Nueva foto detectada y guardada."
+
+        validators = result["validators"]
+        await db_async.mark_photo_seen(
+            latest["_id"],
+            validators=validators if validators != latest.get("validators") else None
+        )
+        return CHECK_UNCHANGED, "ℹ️ No hubo cambios."
+    except Exception as e:
+        return CHECK_ERROR, f"Error verificando foto: {e}"
+
+
+async def check_and_update_photo():
+    """
+    Igual que check_photo() pero retorna (hubo_cambio: bool, mensaje: str).
+    """
+    status, msg = await check_photo()
+    return status == CHECK_CHANGED, msg
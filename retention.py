@@ -0,0 +1,232 @@
+# retention.py
+# ============================================
+# Retención y archivado de `access_log`, `access_stats` e `history`.
+#
+# Uso:
+#   python retention.py                       # políticas de [retention] (config.py)
+#   python retention.py --log-days 90 --history-days 365 --archive file --dry-run
+#
+# Políticas (por defecto, configurables en PHOTO_CONFIG / .streamlit/secrets.toml):
+#   [retention]
+#   access_log_days = 90        # logs crudos; los rollups diarios se conservan
+#   hourly_stats_days = 30      # rollups por hora (los diarios no se borran)
+#   history_days = 365          # historial no visto en X días → archivo frío
+#   archive = "collection"      # "collection" (history_archive, zstd) o "file"
+#   archive_dir = "archive"
+#   batch_size = 1000
+#   pause_seconds = 0.2
+# ============================================
+
+import argparse
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import pytz
+from pymongo import ReplaceOne
+from pymongo.errors import CollectionInvalid
+
+import config
+from db import get_db, get_collection, LATEST_SORT
+
+DEFAULTS = {
+    "access_log_days": 90,
+    "hourly_stats_days": 30,
+    "history_days": 365,
+    "archive": "collection",
+    "archive_dir": "archive",
+    "batch_size": 1000,
+    "pause_seconds": 0.2,
+}
+
+# ==============================
+# Configuración
+# ==============================
+def load_policy(**overrides) -> dict:
+    """Políticas efectivas: DEFAULTS ← [retention] ← overrides (no None)."""
+    policy = dict(DEFAULTS)
+    policy.update(config.section("retention"))
+    policy.update({k: v for k, v in overrides.items() if v is not None})
+    return policy
+
+
+def _cutoff(days) -> datetime:
+    return datetime.now(pytz.UTC) - timedelta(days=int(days))
+
+# ==============================
+# Borrado por lotes
+# ==============================
+def delete_in_batches(col, query, *, batch_size, pause_seconds, dry_run=False,
+                      before_delete=None) -> int:
+    """
+    Borra los documentos que cumplen `query` en lotes de `batch_size` (_id ascendente),
+    con una pausa entre lotes para no saturar el primario.
+    `before_delete(docs)` se llama con cada lote antes de borrarlo (archivado).
+    Retorna la cantidad borrada (o la que se borraría si dry_run).
+    """
+    if dry_run:
+        return col.count_documents(query)
+
+    deleted = 0
+    last_id = None
+    while True:
+        page_query = dict(query)
+        if last_id is not None:
+            page_query = {"$and": [query, {"_id": {"$gt": last_id}}]}
+        docs = list(col.find(page_query).sort("_id", 1).limit(batch_size))
+        if not docs:
+            break
+        if before_delete is not None:
+            before_delete(docs)
+        ids = [d["_id"] for d in docs]
+        deleted += col.delete_many({"_id": {"$in": ids}}).deleted_count
+        last_id = ids[-1]
+        if len(docs) < batch_size:
+            break
+        time.sleep(pause_seconds)
+    return deleted
+
+# ==============================
+# Archivado de historial
+# ==============================
+def archive_collection(db):
+    """Colección fría `history_archive` con compresión zstd (se crea si no existe)."""
+    try:
+        return db.create_collection(
+            "history_archive",
+            storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}},
+        )
+    except CollectionInvalid:
+        return db["history_archive"]
+
+
+def file_archiver(archive_dir: str):
+    """
+    Retorna una función que agrega lotes a <archive_dir>/history-<fecha>.jsonl.gz
+    (JSON extendido simple: fechas ISO y ObjectId como string).
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"history-{datetime.now(pytz.UTC):%Y%m%d}.jsonl.gz")
+
+    def write(docs):
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for doc in docs:
+                f.write(json.dumps(doc, default=str) + "\n")
+    return write
+
+# ==============================
+# Políticas
+# ==============================
+def prune_access_logs(policy, dry_run=False) -> int:
+    """
+    Borra logs crudos más antiguos que access_log_days.
+    Los rollups (access_stats) se mantienen al escribir, así que los conteos
+    ya están agregados. Para logs previos a los rollups: db.rebuild_access_stats()
+    (antes de podar; solo reconstruye el rango que access_log aún cubre).
+    """
+    db = get_db()
+    if db is None:
+        return 0
+    return delete_in_batches(
+        db.access_log, {"ts": {"$lt": _cutoff(policy["access_log_days"])}},
+        batch_size=policy["batch_size"], pause_seconds=policy["pause_seconds"],
+        dry_run=dry_run,
+    )
+
+
+def prune_hourly_stats(policy, dry_run=False) -> int:
+    """Borra rollups por hora más antiguos que hourly_stats_days (quedan los diarios)."""
+    db = get_db()
+    if db is None:
+        return 0
+    query = {"period": "hour", "start": {"$lt": _cutoff(policy["hourly_stats_days"])}}
+    return delete_in_batches(
+        db.access_stats, query,
+        batch_size=policy["batch_size"], pause_seconds=policy["pause_seconds"],
+        dry_run=dry_run,
+    )
+
+
+def current_record_ids(col) -> list:
+    """_id del registro vigente de cada photo_url (mismo orden que get_latest_record)."""
+    pipeline = [
+        {"$sort": dict(LATEST_SORT)},
+        {"$group": {"_id": "$photo_url", "current": {"$first": "$_id"}}},
+    ]
+    return [group["current"] for group in col.aggregate(pipeline, allowDiskUse=True)]
+
+
+def archive_history(policy, dry_run=False) -> int:
+    """
+    Mueve al almacenamiento frío los registros de historial no vistos en
+    history_days (según last_seen_at, o checked_at en registros antiguos).
+    El registro más reciente de cada photo_url (el que devolvería
+    get_latest_record) nunca se archiva, aunque nadie lo haya verificado
+    en ese plazo (p. ej. sin worker corriendo).
+    """
+    db = get_db()
+    col = get_collection()
+    if db is None or col is None:
+        return 0
+
+    cutoff = _cutoff(policy["history_days"])
+    query = {
+        "$or": [
+            {"last_seen_at": {"$lt": cutoff}},
+            {"last_seen_at": {"$exists": False}, "checked_at": {"$lt": cutoff}},
+        ],
+        "_id": {"$nin": current_record_ids(col)},
+    }
+
+    if dry_run:
+        before_delete = None
+    elif policy["archive"] == "file":
+        before_delete = file_archiver(policy["archive_dir"])
+    else:
+        cold = archive_collection(db)
+
+        def before_delete(docs):
+            # upsert por _id: reintentar tras un corte no duplica
+            cold.bulk_write([ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs],
+                            ordered=False)
+
+    return delete_in_batches(
+        col, query,
+        batch_size=policy["batch_size"], pause_seconds=policy["pause_seconds"],
+        dry_run=dry_run, before_delete=before_delete,
+    )
+
+
+def run_retention(policy=None, dry_run=False) -> dict:
+    """Aplica todas las políticas y retorna un resumen con las cantidades."""
+    policy = policy or load_policy()
+    return {
+        "access_log": prune_access_logs(policy, dry_run),
+        "access_stats_hourly": prune_hourly_stats(policy, dry_run),
+        "history_archived": archive_history(policy, dry_run),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retención y archivado de datos")
+    parser.add_argument("--log-days", type=int, dest="access_log_days")
+    parser.add_argument("--hourly-days", type=int, dest="hourly_stats_days")
+    parser.add_argument("--history-days", type=int, dest="history_days")
+    parser.add_argument("--archive", choices=("collection", "file"))
+    parser.add_argument("--archive-dir", dest="archive_dir")
+    parser.add_argument("--batch-size", type=int, dest="batch_size")
+    parser.add_argument("--pause", type=float, dest="pause_seconds")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Solo contar lo que se borraría/archivaría")
+    args = vars(parser.parse_args())
+    dry_run = args.pop("dry_run")
+
+    summary = run_retention(load_policy(**args), dry_run=dry_run)
+    verbo = "se procesarían" if dry_run else "procesados"
+    for name, count in summary.items():
+        print(f"✅ {name}: {count} documentos {verbo}")
+
+
+if __name__ == "__main__":
+    main()
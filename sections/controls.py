@@ -3,18 +3,26 @@ import streamlit as st
 from datetime import datetime
 from db import insert_photo_record
 from sections.inspector import show_debug, compare_urls
+from metrics import timed
 
 # ---------------------------
 # Función para manejar input de URL
 # ---------------------------
 
+@st.fragment
+@timed("sections.controls.handle_url_input")
 def handle_url_input(latest, geo_data):
     """
     Maneja la entrada de URL para:
     - Registrar primer URL
     - Actualizar URL existente
-    Retorna True si se guardó un nuevo registro.
+    Como fragmento, escribir en el input solo reejecuta esta sección;
+    al guardar se reejecuta toda la página para mostrar el registro nuevo.
     """
+    saved_msg = st.session_state.pop("url_saved_msg", None)
+    if saved_msg:
+        st.success(saved_msg)
+
     url_mongo = latest.get("photo_url", "") if latest else ""
     nuevo_url = None
 
@@ -29,7 +37,7 @@ def handle_url_input(latest, geo_data):
         if url_mongo and url_mongo == nuevo_url:
             st.success("✅ El link en Mongo es IGUAL al nuevo. No se requiere actualización.")
             st.session_state.show_input = False
-            return False
+            return
 
         # Caso: link distinto → mostrar diferencias
         if url_mongo:
@@ -40,20 +48,20 @@ def handle_url_input(latest, geo_data):
 
         # Guardar registro en Mongo
         try:
-            insert_photo_record(
+            inserted = insert_photo_record(
                 photo_url=nuevo_url,
                 hash_value=hash_value,
                 checked_at=datetime.utcnow(),
                 geo_data=geo_data
             )
-            if url_mongo:
-                st.success("✅ Nuevo enlace guardado en Mongo")
+            if inserted is False:
+                st.session_state.url_saved_msg = "ℹ️ Este enlace ya estaba registrado en Mongo"
+            elif url_mongo:
+                st.session_state.url_saved_msg = "✅ Nuevo enlace guardado en Mongo"
             else:
-                st.success("✅ Primer enlace guardado en Mongo")
+                st.session_state.url_saved_msg = "✅ Primer enlace guardado en Mongo"
             st.session_state.show_input = False
-            return True
         except Exception as e:
             st.error(f"💥 Error en insert_photo_record: {e}")
-            return False
-
-    return False
+            return
+        st.rerun()  # refrescar inspector e imagen con el registro nuevo
@@ -0,0 +1,30 @@
+# sections/debug.py
+import streamlit as st
+import metrics
+
+def show_metrics_panel():
+    """
+    Panel de depuración con los tiempos de la ejecución actual (rerun)
+    y los acumulados del proceso. Solo se muestra con métricas activas
+    y ?debug=1 en la URL.
+    """
+    if not metrics.enabled() or st.query_params.get("debug") != "1":
+        return
+
+    import pandas as pd  # solo con el panel de depuración visible
+    with st.expander("⏱️ Tiempos (debug)"):
+        events = metrics.run_events()
+        if events:
+            df = pd.DataFrame(events, columns=["Operación", "Segundos", "Error"])
+            df["ms"] = (df["Segundos"] * 1000).round(1)
+            st.markdown("**Esta ejecución**")
+            st.dataframe(df[["Operación", "ms", "Error"]], use_container_width=True)
+
+        totals = metrics.snapshot()
+        if totals:
+            df = pd.DataFrame.from_dict(totals, orient="index")
+            df["prom ms"] = (df["total_s"] / df["count"] * 1000).round(1)
+            df["máx ms"] = (df["max_s"] * 1000).round(1)
+            st.markdown("**Acumulado del proceso**")
+            st.dataframe(df[["count", "errors", "prom ms", "máx ms", "bytes"]],
+                         use_container_width=True)
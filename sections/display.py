@@ -1,37 +1,66 @@
 # sections/display.py
 import streamlit as st
-from photo_checker import check_and_update_photo, download_image
+from metrics import timed
+from photo_checker import check_and_update_photo, load_thumbnail
 
 # ---------------------------
 # Funciones para mostrar imagen y verificación manual
 # ---------------------------
 
-def show_image(url_mongo, nuevo_guardado):
+@st.cache_data(ttl=3600, max_entries=32, show_spinner=False)
+def cached_thumbnail(url_mongo, hash_value):
+    """
+    Miniatura cacheada por (URL, hash): solo se recalcula cuando cambia el registro.
+    Lanza excepción si no se pudo cargar (los errores no quedan cacheados).
+    """
+    img_bytes = load_thumbnail(url_mongo, hash_value)
+    if not img_bytes:
+        raise ValueError("No se pudo cargar la imagen")
+    return img_bytes
+
+
+@st.fragment
+@timed("sections.display.show_image")
+def show_image(url_mongo, hash_value=None):
     """
     Muestra la imagen actual si existe y alerta si no hay foto registrada.
+    Usa la caché local por hash para no descargarla en cada rerun
+    y muestra la miniatura reducida en vez del original.
+    Se renderiza como fragmento: las interacciones de otras secciones no la recalculan.
     """
     try:
         if url_mongo:
-            img_bytes = download_image(url_mongo)
+            try:
+                img_bytes = cached_thumbnail(url_mongo, hash_value)
+            except ValueError:
+                img_bytes = None
             if img_bytes:
                 st.image(img_bytes, caption="Miniatura actual")
             else:
                 st.error("❌ No se pudo cargar la imagen")
-        elif not url_mongo and not nuevo_guardado:
+        else:
             st.warning("⚠️ No hay fotos registradas en la base de datos.")
     except Exception as e:
         st.error(f"❌ Error: {e}")
 
 
+@st.fragment
+@timed("sections.display.manual_verification")
 def manual_verification():
     """
     Botón para verificación manual de la foto.
     Actualiza session_state.show_input según si hubo cambio.
+    Como fragmento, el clic solo reejecuta esta sección; si hubo cambio
+    se reejecuta toda la página para refrescar inspector, input e imagen.
     """
     if st.button("🔄 Verificar foto ahora"):
         changed, msg = check_and_update_photo()
         st.session_state.show_input = changed
         if changed:
-            st.success(msg)
-        else:
-            st.info(msg)
+            st.session_state.verify_msg = msg
+            st.rerun()
+        st.info(msg)
+
+    msg = st.session_state.pop("verify_msg", None)
+    if msg:
+        st.success(msg)
@@ -1,28 +1,152 @@
 # sections/history.py
 import streamlit as st
-import pandas as pd
 import pytz
+from metrics import timed
+from db import (get_access_logs, get_access_logs_page, get_access_stats, acc_percentile,
+                LOG_PAGE_SIZE, DEFAULT_LOG_WINDOW)
+from geo_utils import formato_decimal_vec, formato_gms_vec, agrupar_ubicaciones
 
-def show_access_logs(logs):
+def logs_to_dataframe(logs):
     """
-    Muestra en un dataframe el historial de accesos con:
+    Convierte registros de accesos (orden ascendente) en un DataFrame con:
     - Fecha
     - Latitud/Longitud
     - Precisión ±m
+    El último acceso queda primero.
     """
-    if logs:
-        colombia = pytz.timezone("America/Bogota")
-        data = []
-        for l in logs:
-            ts = l["ts"].astimezone(colombia).strftime("%d %b %y %H:%M")
-            data.append({
-                "Fecha": ts,
-                "Lat": f"{l.get('lat'):.6f}" if l.get("lat") else None,
-                "Lon": f"{l.get('lon'):.6f}" if l.get("lon") else None,
-                "±m": f"{int(l.get('acc'))}" if l.get("acc") else None,
-            })
-        df = pd.DataFrame(data)
-        df.index = range(1, len(df) + 1)
-        df = df.iloc[::-1]  # mostrar último acceso primero
-        st.subheader("📜 Historial de accesos")
-        st.dataframe(df, use_container_width=True)
+    import pandas as pd  # pandas se carga solo al mostrar el historial
+    colombia = pytz.timezone("America/Bogota")
+    raw = pd.DataFrame.from_records(logs, columns=["ts", "lat", "lon", "acc"])
+
+    # Formateo por columnas (sin recorrer fila a fila)
+    ts = pd.to_datetime(raw["ts"], utc=True).dt.tz_convert(colombia)
+    lat = pd.to_numeric(raw["lat"], errors="coerce")
+    lon = pd.to_numeric(raw["lon"], errors="coerce")
+    acc = pd.to_numeric(raw["acc"], errors="coerce")
+
+    df = pd.DataFrame({
+        "Fecha": ts.dt.strftime("%d %b %y %H:%M"),
+        "Lat": formato_decimal_vec(lat.to_numpy()),
+        "Lon": formato_decimal_vec(lon.to_numpy()),
+        "±m": acc.fillna(0).astype(int).astype(str).where(acc.fillna(0) != 0, None),
+    })
+    df.index = range(1, len(df) + 1)
+    return df.iloc[::-1]  # mostrar último acceso primero
+
+
+@timed("sections.history.show_access_logs_paged")
+def show_access_logs_paged(page_size=LOG_PAGE_SIZE):
+    """
+    Muestra el historial de accesos cargando páginas bajo demanda
+    (botón "Cargar más") en lugar de traer toda la colección.
+    Las páginas ya cargadas se guardan en st.session_state.
+    """
+    state = st.session_state
+    logged = state.get("access_logged", False)
+    # Recargar desde la primera página si aún no hay páginas
+    # o si se registró el acceso actual después de cargarlas
+    if "access_log_pages" not in state or state.access_log_pages["logged"] != logged:
+        logs, cursor = get_access_logs_page(page_size)
+        state.access_log_pages = {"logs": logs, "cursor": cursor, "logged": logged}
+
+    pages = state.access_log_pages
+    if not pages["logs"]:
+        return
+
+    # Las páginas vienen del más reciente al más antiguo
+    df = logs_to_dataframe(pages["logs"][::-1])
+    st.subheader("📜 Historial de accesos")
+    st.dataframe(df, use_container_width=True)
+
+    if pages["cursor"] is not None:
+        st.button("⬇️ Cargar más accesos", on_click=load_more_access_logs, args=(page_size,))
+
+
+def load_more_access_logs(page_size=LOG_PAGE_SIZE):
+    """Callback del botón "Cargar más": agrega la página siguiente al estado."""
+    pages = st.session_state.access_log_pages
+    logs, cursor = get_access_logs_page(page_size, after=pages["cursor"])
+    pages["logs"].extend(logs)
+    pages["cursor"] = cursor
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_access_stats(period="day", limit=30):
+    """Rollups de accesos cacheados (se refrescan cada 5 minutos)."""
+    return get_access_stats(period, limit=limit)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_frequent_places(limit=DEFAULT_LOG_WINDOW, minimo=2, top=10):
+    """
+    Lugares repetidos (celdas geohash ≈ 150 m) en los últimos `limit` accesos,
+    calculados en bloque con NumPy. Retorna [(geohash, cantidad, lat, lon)].
+    """
+    logs = get_access_logs(limit, fields={"lat": 1, "lon": 1})
+    lats = [log.get("lat") if isinstance(log.get("lat"), (int, float)) else float("nan")
+            for log in logs]
+    lons = [log.get("lon") if isinstance(log.get("lon"), (int, float)) else float("nan")
+            for log in logs]
+    return agrupar_ubicaciones(lats, lons, precision=7, minimo=minimo)[:top]
+
+
+@timed("sections.history.show_frequent_places")
+def show_frequent_places():
+    """Tabla de los lugares desde donde más se accede (últimos accesos)."""
+    places = cached_frequent_places()
+    if not places:
+        return
+
+    import pandas as pd
+    _, counts, lats, lons = zip(*places)
+    lat_gms, lon_gms = formato_gms_vec(lats, lons)
+    df = pd.DataFrame({"Accesos": counts, "Latitud": lat_gms, "Longitud": lon_gms},
+                      index=[p[0] for p in places])
+    df.index.name = "Geohash"
+    st.subheader("📍 Lugares frecuentes")
+    st.dataframe(df, use_container_width=True)
+
+
+@timed("sections.history.show_access_summary")
+def show_access_summary(days=30):
+    """
+    Muestra un resumen de accesos leyendo los rollups diarios (access_stats):
+    - Accesos por día
+    - Precisión p50/p90 estimada
+    - Celdas de ubicación distintas
+    """
+    stats = cached_access_stats("day", limit=days)
+    if not stats:
+        return
+
+    import pandas as pd
+    colombia = pytz.timezone("America/Bogota")
+    data = []
+    for s in stats:
+        hist = s.get("acc_hist", {})
+        data.append({
+            "Día": s["start"].astimezone(colombia).strftime("%d %b %y"),
+            "Accesos": s.get("count", 0),
+            "Con ubicación": s.get("with_location", 0),
+            "p50 ±m": acc_percentile(hist, 0.5),
+            "p90 ±m": acc_percentile(hist, 0.9),
+            "Lugares": len(s.get("cells", [])),
+        })
+    df = pd.DataFrame(data).set_index("Día")
+
+    st.subheader(f"📊 Resumen de accesos (últimos {days} días)")
+    st.bar_chart(df["Accesos"])
+    st.dataframe(df.iloc[::-1], use_container_width=True)
+
+
+@st.fragment
+def show_history_section():
+    """
+    Historial y resumen de accesos bajo demanda: no se consulta la DB
+    hasta que el usuario activa la sección. Al ser un fragmento, paginar
+    o cambiar el toggle no reejecuta el resto de la página.
+    """
+    if st.toggle("📜 Ver historial de accesos"):
+        show_access_summary()
+        show_frequent_places()
+        show_access_logs_paged()
@@ -4,11 +4,13 @@ from geo_utils import formato_gms_con_hemisferio
 from datetime import datetime
 import hashlib
 from urllib.parse import urlparse, parse_qs
+from metrics import timed
 
 # ---------------------------
 # Inspector “vivo” y legible
 # ---------------------------
 
+@timed("sections.inspector.show_latest_record")
 def show_latest_record(latest, geo_data):
     """
     Muestra el estado del último registro de foto de forma legible y con vida.
@@ -0,0 +1,28 @@
+# st_adapter.py
+# ============================================
+# Adaptador Streamlit → capa de datos.
+# La capa de datos (config.py, db.py) no depende de Streamlit; aquí solo se
+# pasan los st.secrets a config.configure() una vez por proceso.
+# ============================================
+
+import streamlit as st
+import config
+from db import ensure_indexes_once
+
+
+def secrets_dict() -> dict:
+    """st.secrets como dict plano ({} si no hay secrets.toml)."""
+    try:
+        return st.secrets.to_dict()
+    except FileNotFoundError:
+        return {}
+
+
+@st.cache_resource
+def bootstrap():
+    """
+    Configura la capa de datos con st.secrets (secrets de Streamlit Cloud
+    incluidos) y asegura los índices. Una sola vez por proceso.
+    """
+    config.configure(secrets_dict())
+    return ensure_indexes_once()
@@ -0,0 +1,63 @@
+# thumbnails.py
+# ============================================
+# Miniaturas (renditions) reducidas para mostrar en la UI
+# ============================================
+
+import io
+
+from image_cache import get_cached, put_cached
+
+# Anchos generados por cada hash nuevo y formato de salida
+RENDITION_SIZES = (256, 1024)
+RENDITION_FORMAT = "WEBP"
+RENDITION_QUALITY = 80
+
+# ==============================
+# Generación
+# ==============================
+def rendition_variant(width: int, fmt: str = RENDITION_FORMAT) -> str:
+    """Nombre de la variante en caché, p. ej. 'w256.webp'."""
+    return f"w{width}.{fmt.lower()}"
+
+
+def make_rendition(content: bytes, width: int, fmt: str = RENDITION_FORMAT) -> bytes:
+    """
+    Reduce la imagen para que su lado mayor no supere `width` px
+    (respeta la orientación EXIF) y la codifica en `fmt` (WEBP/JPEG).
+    """
+    from PIL import Image, ImageOps  # Pillow solo se carga al generar miniaturas
+    with Image.open(io.BytesIO(content)) as img:
+        img = ImageOps.exif_transpose(img)
+        img.thumbnail((width, width))
+        if fmt.upper() == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        out = io.BytesIO()
+        img.save(out, format=fmt, quality=RENDITION_QUALITY)
+        return out.getvalue()
+
+
+def ensure_renditions(hash_value: str, content=None, sizes=RENDITION_SIZES):
+    """
+    Genera (una sola vez) las miniaturas de una imagen ya identificada por su hash.
+    Usa `content` si se pasa; si no, lee el original desde la caché local.
+    Retorna la cantidad de miniaturas nuevas generadas.
+    """
+    pending = [w for w in sizes if get_cached(hash_value, rendition_variant(w)) is None]
+    if not pending:
+        return 0
+
+    if content is None:
+        content = get_cached(hash_value)
+        if content is None:
+            return 0
+
+    for width in pending:
+        put_cached(make_rendition(content, width), hash_value, rendition_variant(width))
+    return len(pending)
+
+
+def get_rendition(hash_value: str, width: int):
+    """
+    Devuelve la miniatura de `width` px desde la caché (o None si no existe).
+    """
+    return get_cached(hash_value, rendition_variant(width))
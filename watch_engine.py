@@ -0,0 +1,117 @@
+# watch_engine.py
+# ============================================
+# Verificación concurrente de múltiples fotos vigiladas
+# ============================================
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlparse
+import pytz
+
+from http_client import POOL_PER_HOST
+from db import get_watches, update_watch_state, insert_photo_record, flush_writes
+from photo_checker import detect_change
+
+# Límites por defecto del pool
+MAX_WORKERS = 32
+MAX_PER_HOST = min(4, POOL_PER_HOST)  # no superar las conexiones del pool HTTP
+
+# ==============================
+# Límite de concurrencia por host
+# ==============================
+class HostLimiter:
+    """
+    Semáforos por host para no saturar un mismo servidor/CDN
+    aunque el pool global tenga muchos workers.
+    """
+
+    def __init__(self, per_host: int = MAX_PER_HOST):
+        self.per_host = per_host
+        self._lock = threading.Lock()
+        self._sems = {}
+
+    def for_url(self, url: str) -> threading.BoundedSemaphore:
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            if host not in self._sems:
+                self._sems[host] = threading.BoundedSemaphore(self.per_host)
+            return self._sems[host]
+
+# ==============================
+# Verificación de una URL vigilada
+# ==============================
+def check_watch(watch: dict, limiter: HostLimiter) -> dict:
+    """
+    Verifica una URL vigilada respetando el límite por host.
+    Si cambió → inserta registro en history y actualiza el watch.
+
+    Retorna un dict con photo_url, status, hash, error y elapsed (s).
+    """
+    url = watch["photo_url"]
+    start = time.perf_counter()
+
+    with limiter.for_url(url):
+        result = detect_change(url, watch.get("hash"), watch.get("validators"),
+                               last_phash=watch.get("phash"))
+
+    now_utc = datetime.now(pytz.UTC)
+    try:
+        if result["status"] == "changed":
+            insert_photo_record(url, result["hash"], checked_at=now_utc,
+                                validators=result["validators"], phash=result["phash"],
+                                buffered=True)
+            update_watch_state(watch["_id"], hash_value=result["hash"],
+                               validators=result["validators"], checked_at=now_utc,
+                               phash=result["phash"])
+        elif result["status"] == "unchanged":
+            update_watch_state(watch["_id"], validators=result["validators"],
+                               checked_at=now_utc)
+    except Exception as e:
+        result = {**result, "status": "error", "error": f"DB: {e}"}
+
+    return {
+        "photo_url": url,
+        "status": result["status"],
+        "hash": result.get("hash"),
+        "error": result.get("error"),
+        "elapsed": time.perf_counter() - start,
+    }
+
+# ==============================
+# Barrido completo
+# ==============================
+def run_sweep(watches=None, *, max_workers: int = MAX_WORKERS,
+              per_host: int = MAX_PER_HOST) -> dict:
+    """
+    Verifica todas las URLs vigiladas en paralelo con un pool acotado.
+
+    Retorna un reporte del barrido:
+      - started_at / finished_at (UTC)
+      - total, changed, unchanged, error
+      - results: lista con el resultado de cada URL
+    """
+    if watches is None:
+        watches = get_watches()
+
+    limiter = HostLimiter(per_host)
+    started_at = datetime.now(pytz.UTC)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        results = list(pool.map(lambda w: check_watch(w, limiter), watches))
+
+    # Los registros nuevos se insertan por lotes; vaciar al terminar el barrido
+    flush_writes()
+
+    counts = Counter(r["status"] for r in results)
+    return {
+        "started_at": started_at,
+        "finished_at": datetime.now(pytz.UTC),
+        "total": len(results),
+        "changed": counts.get("changed", 0),
+        "unchanged": counts.get("unchanged", 0),
+        "error": counts.get("error", 0),
+        "results": results,
+    }
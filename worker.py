@@ -0,0 +1,167 @@
+# worker.py
+# ============================================
+# Verificador periódico sin interfaz (sin sesión de Streamlit)
+#
+# Uso:
+#   python worker.py --interval 300 --jitter 30
+#   python worker.py --once
+#   python worker.py --sweep        # verifica todas las URLs vigiladas
+# ============================================
+
+import argparse
+import os
+import random
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime
+import pytz
+
+from db import acquire_lock, release_lock, ensure_indexes
+from photo_checker import check_photo, CHECK_ERROR
+import metrics
+
+colombia = pytz.timezone("America/Bogota")
+
+LOCK_NAME = "photo_checker"
+
+# ==============================
+# Una ejecución protegida por lock
+# ==============================
+def run_once(owner: str, lock_ttl: int, sweep: bool = False):
+    """
+    Ejecuta una verificación si se obtiene el lock en Mongo.
+    Retorna (ok: bool, mensaje: str). ok=False indica fallo (para backoff).
+    """
+    if not acquire_lock(LOCK_NAME, owner, ttl_seconds=lock_ttl):
+        return True, "⏭️ Otro proceso tiene el lock, se omite esta ejecución."
+
+    try:
+        with keep_lock(owner, lock_ttl):
+            if sweep:
+                from watch_engine import run_sweep
+                report = run_sweep()
+                msg = (f"Barrido: {report['total']} URLs, {report['changed']} cambios, "
+                       f"{report['error']} errores")
+                return report["error"] == 0, msg
+
+            status, msg = check_photo()
+            return status != CHECK_ERROR, msg
+    finally:
+        release_lock(LOCK_NAME, owner)
+
+
+@contextmanager
+def keep_lock(owner: str, lock_ttl: int):
+    """
+    Renueva el lock cada lock_ttl/3 segundos mientras dura el bloque, para que
+    un barrido largo no sobreviva al TTL y se solape con la siguiente ejecución.
+    """
+    stop = threading.Event()
+
+    def renew():
+        while not stop.wait(lock_ttl / 3):
+            try:
+                if not acquire_lock(LOCK_NAME, owner, ttl_seconds=lock_ttl):
+                    print("⚠️ No se pudo renovar el lock (lo tomó otro proceso)", flush=True)
+            except Exception as e:
+                print(f"⚠️ Error renovando el lock: {e}", flush=True)
+
+    thread = threading.Thread(target=renew, name="lock-renew", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+# ==============================
+# Cálculo de espera
+# ==============================
+def next_delay(interval: float, jitter: float, failures: int, max_backoff: float) -> float:
+    """
+    Calcula la espera hasta la próxima ejecución:
+    - Sin fallos → interval ± jitter
+    - Con fallos → backoff exponencial (interval * 2^fallos) acotado a max_backoff
+      (el exponente se limita para no desbordar en cortes largos)
+    """
+    base = interval if failures == 0 else min(interval * (2 ** min(failures, 20)), max_backoff)
+    return max(0.0, base + random.uniform(-jitter, jitter))
+
+# ==============================
+# Endpoint de métricas (Prometheus)
+# ==============================
+def serve_metrics(port: int):
+    """Sirve /metrics (texto Prometheus) en un hilo de fondo."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            as_json = self.path.startswith("/metrics.json")
+            body = (metrics.export_json() if as_json else metrics.export_prometheus()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json" if as_json
+                             else "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+
+# ==============================
+# Bucle principal
+# ==============================
+def main():
+    parser = argparse.ArgumentParser(description="Verificador periódico de fotos")
+    parser.add_argument("--interval", type=float,
+                        default=float(os.environ.get("CHECK_INTERVAL", 300)),
+                        help="Segundos entre verificaciones (default 300)")
+    parser.add_argument("--jitter", type=float,
+                        default=float(os.environ.get("CHECK_JITTER", 30)),
+                        help="Variación aleatoria ± en segundos (default 30)")
+    parser.add_argument("--max-backoff", type=float, default=3600,
+                        help="Espera máxima tras fallos consecutivos (default 3600)")
+    parser.add_argument("--lock-ttl", type=int, default=600,
+                        help="Expiración del lock en Mongo (default 600)")
+    parser.add_argument("--sweep", action="store_true",
+                        help="Verificar todas las URLs vigiladas (watches)")
+    parser.add_argument("--once", action="store_true",
+                        help="Ejecutar una sola vez y salir")
+    parser.add_argument("--metrics-port", type=int, default=0,
+                        help="Puerto para /metrics (activa la instrumentación)")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        metrics.enable()
+        serve_metrics(args.metrics_port)
+
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    failures = 0
+
+    try:
+        ensure_indexes()
+    except Exception as e:
+        print(f"⚠️ No se pudieron asegurar índices: {e}", flush=True)
+
+    while True:
+        try:
+            with metrics.track("worker.run_once"):
+                ok, msg = run_once(owner, args.lock_ttl, sweep=args.sweep)
+        except Exception as e:
+            ok, msg = False, f"Error en worker: {e}"
+
+        failures = 0 if ok else failures + 1
+        metrics.export_to_file()
+        print(f"[{datetime.now(colombia).strftime('%d %b %y %H:%M:%S')}] {msg}", flush=True)
+
+        if args.once:
+            break
+        time.sleep(next_delay(args.interval, args.jitter, failures, args.max_backoff))
+
+
+if __name__ == "__main__":
+    main()
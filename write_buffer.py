@@ -0,0 +1,221 @@
+# write_buffer.py
+# ============================================
+# Buffer de escritura asíncrono (write-behind) para MongoDB
+# Agrupa documentos (u operaciones de escritura como UpdateOne) y los
+# escribe con bulk_write(ordered=False).
+# ============================================
+
+import atexit
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from pymongo import InsertOne
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+# Valores por defecto
+BATCH_SIZE = 100        # documentos por bulk_write
+FLUSH_INTERVAL = 2.0    # segundos máximos que un documento espera en el buffer
+MAX_QUEUE = 10000       # tamaño máximo de la cola (backpressure)
+PUT_TIMEOUT = 5.0       # segundos que espera el productor si la cola está llena
+RETRY_ATTEMPTS = 3      # reintentos inmediatos ante errores transitorios
+RETRY_BACKOFF = 0.5     # espera base (s) entre reintentos, se duplica en cada uno
+
+# Códigos de error de escritura transitorios (red, elección de primario, apagado)
+TRANSIENT_CODES = {6, 7, 89, 91, 189, 9001, 10107, 11600, 11602, 13435, 13436}
+
+
+class WriteBuffer:
+    """
+    Cola acotada + hilo de fondo que vacía documentos por lotes.
+
+    - add(): encola un documento (se inserta) o una operación de pymongo
+      (UpdateOne, p. ej. upserts); si la cola está llena, bloquea hasta
+      PUT_TIMEOUT (backpressure) y luego escribe de forma síncrona.
+    - El hilo escribe cuando hay BATCH_SIZE documentos o pasa FLUSH_INTERVAL.
+    - flush()/close() vacían el buffer (se llama también al salir del proceso).
+    - Errores transitorios (AutoReconnect, primario caído): se reintenta con
+      backoff y, si persisten, los documentos vuelven a pendientes para el
+      siguiente ciclo (hasta max_queue pendientes; luego se descartan).
+
+    `get_collection(nombre)` debe devolver la colección de pymongo (o None).
+    `on_written(nombre, items)` (opcional) se llama tras cada lote escrito.
+    """
+
+    def __init__(self, get_collection, *, on_written=None, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE,
+                 put_timeout=PUT_TIMEOUT):
+        self._get_collection = get_collection
+        self._on_written = on_written
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.max_queue = max_queue
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._write_lock = threading.RLock()
+        self._pending_lock = threading.Lock()
+        self._pending = defaultdict(list)
+        self._pending_count = 0
+        self._retrying = set()   # claves (_key) de lo que ya se intentó escribir
+        self._closed = False
+        self._pid = os.getpid()
+        self.written = 0
+        self.errors = 0
+
+        self._thread = threading.Thread(target=self._run, name="write-buffer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ------------------------------
+    # Productor
+    # ------------------------------
+    def add(self, collection: str, document):
+        """Encola un documento (o una operación de escritura) para `collection`."""
+        if self._closed:
+            self._write({collection: [document]})
+            return
+        try:
+            self._queue.put((collection, document), timeout=self.put_timeout)
+        except queue.Full:
+            # Cola saturada → escritura directa para no perder el documento
+            self._write({collection: [document]})
+
+    # ------------------------------
+    # Consumidor
+    # ------------------------------
+    def _collect(self, item):
+        """Agrega un documento a los pendientes (agrupados por colección)."""
+        with self._pending_lock:
+            self._pending[item[0]].append(item[1])
+            self._pending_count += 1
+
+    def _take_pending(self) -> dict:
+        """Retira todos los pendientes para escribirlos."""
+        with self._pending_lock:
+            batches = self._pending
+            self._pending = defaultdict(list)
+            self._pending_count = 0
+            return batches
+
+    def _write_pending(self):
+        """Retira y escribe los pendientes como una sola operación."""
+        with self._write_lock:
+            self._write(self._take_pending())
+
+    @staticmethod
+    def _key(item):
+        """Identidad de un elemento entre reintentos: _id del documento o la operación."""
+        return item.get("_id") if isinstance(item, dict) else id(item)
+
+    def _insert(self, col, docs):
+        """
+        bulk_write(ordered=False) de `docs`: los documentos van como InsertOne
+        y las operaciones (UpdateOne, ...) tal cual.
+        Retorna (escritos, a_reintentar, fallidos).
+        """
+        requests = [InsertOne(d) if isinstance(d, dict) else d for d in docs]
+        try:
+            col.bulk_write(requests, ordered=False)  # InsertOne asigna _id en cada documento
+            return docs, [], []
+        except AutoReconnect:
+            return [], docs, []  # red / sin primario → reintentar el lote completo
+        except BulkWriteError as e:
+            codes = {w["index"]: w.get("code") for w in e.details.get("writeErrors", [])}
+            written, retry, failed = [], [], []
+            for i, doc in enumerate(docs):
+                code = codes.get(i)
+                if code is None:
+                    written.append(doc)
+                elif code == 11000:
+                    if not isinstance(doc, dict):
+                        retry.append(doc)  # upsert concurrente: al reintentar actualiza
+                    elif doc.get("_id") in self._retrying:
+                        # Duplicado: idempotente; si es un reintento, lo escribió el intento anterior
+                        written.append(doc)
+                elif code in TRANSIENT_CODES:
+                    retry.append(doc)
+                else:
+                    failed.append(doc)
+            if failed:
+                print(f"⚠️ write_buffer: {len(failed)} documentos con error en {col.name}: {e}")
+            return written, retry, failed
+
+    def _requeue(self, name: str, docs: list):
+        """Devuelve a pendientes lo que no se pudo escribir (o lo descarta si no cabe)."""
+        with self._pending_lock:
+            if not self._closed and self._pending_count + len(docs) <= self.max_queue:
+                self._pending[name].extend(docs)
+                self._pending_count += len(docs)
+                return
+        self.errors += len(docs)
+        self._retrying.difference_update(self._key(d) for d in docs)
+        print(f"⚠️ write_buffer: se descartan {len(docs)} documentos de {name} tras reintentos")
+
+    def _write(self, batches: dict):
+        with self._write_lock:
+            for name, docs in batches.items():
+                attempt = 0
+                while docs:
+                    try:
+                        col = self._get_collection(name)
+                        if col is None:
+                            break
+                        written, docs, failed = self._insert(col, docs)
+                    except Exception as e:
+                        self.errors += len(docs)
+                        print(f"⚠️ write_buffer: error insertando en {name}: {e}")
+                        break
+                    self.errors += len(failed)
+                    self._retrying.difference_update(self._key(d) for d in written + failed)
+                    if written:
+                        self.written += len(written)
+                        self._notify_written(name, written)
+                    if not docs:
+                        break
+                    self._retrying.update(self._key(d) for d in docs)
+                    attempt += 1
+                    if attempt > RETRY_ATTEMPTS:
+                        self._requeue(name, docs)
+                        break
+                    time.sleep(RETRY_BACKOFF * 2 ** (attempt - 1))
+
+    def _notify_written(self, name: str, docs: list):
+        if self._on_written is not None:
+            try:
+                self._on_written(name, docs)
+            except Exception as e:
+                print(f"⚠️ write_buffer: error en on_written ({name}): {e}")
+
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while not self._closed:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                self._collect(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+
+            if self._pending_count >= self.batch_size or time.monotonic() >= deadline:
+                self._write_pending()
+                deadline = time.monotonic() + self.flush_interval
+
+    # ------------------------------
+    # Vaciado / cierre
+    # ------------------------------
+    def flush(self):
+        """Escribe de inmediato todo lo pendiente y lo que está en la cola."""
+        while True:
+            try:
+                self._collect(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        self._write_pending()
+
+    def close(self):
+        """Detiene el hilo y vacía el buffer (idempotente)."""
+        if self._closed or os.getpid() != self._pid:
+            return  # en un hijo de fork la copia heredada la escribe el padre
+        self._closed = True
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()